@@ -2,44 +2,143 @@ import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from flask_migrate import Migrate
 import logging
 
-# Configurar logging
-logging.basicConfig(level=logging.DEBUG)
+# Configurar logging (LOG_LEVEL=DEBUG para depuração; o padrão não emite logs de debug)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev_key_123")
 
+def _engine_options(prefix):
+    # Pool de conexões por bind: <PREFIXO>_POOL_SIZE, _MAX_OVERFLOW, _POOL_TIMEOUT, _POOL_RECYCLE
+    # e _POOL_PRE_PING. O pre-ping custa uma ida ao banco a cada checkout; com 0, conexões
+    # antigas são descartadas pelo pool_recycle (abaixo do timeout ocioso do servidor)
+    options = {
+        "pool_recycle": int(os.environ.get(f'{prefix}_POOL_RECYCLE', 300)),
+        "pool_pre_ping": os.environ.get(f'{prefix}_POOL_PRE_PING', '1') == '1',
+    }
+    for option in ('pool_size', 'max_overflow', 'pool_timeout'):
+        if os.environ.get(f'{prefix}_{option.upper()}'):
+            options[option] = int(os.environ[f'{prefix}_{option.upper()}'])
+    return options
+
 # Configurar PostgreSQL
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options('DB')
+# Réplicas de leitura (DATABASE_REPLICA_URLS, separadas por vírgula): rotas marcadas com
+# @read_only consultam uma delas. Depois de um commit, as leituras do usuário ficam no
+# primário por REPLICA_STICKY_SECONDS (margem para o atraso da replicação)
+_replica_urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+app.config['DATABASE_REPLICAS'] = [f'replica_{index}' for index in range(1, len(_replica_urls) + 1)]
+app.config['SQLALCHEMY_BINDS'] = {
+    key: dict(url=url, **_engine_options('REPLICA'))
+    for key, url in zip(app.config['DATABASE_REPLICAS'], _replica_urls)
 }
+app.config['REPLICA_STICKY_SECONDS'] = float(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+# Cache: 'filesystem' (compartilhado entre os workers do mesmo host) ou 'memory' (LRU por
+# processo). 'memory' só serve para um único worker: invalidações (versões dos escopos do
+# calendário, sessão) feitas em um processo não chegam aos outros
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'filesystem')
+app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR', os.path.join(app.instance_path, 'cache'))
+app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+app.config['CALENDAR_CACHE_TTL'] = int(os.environ.get('CALENDAR_CACHE_TTL', 300))
+# Assinatura ICS: eventos encerrados há mais de N dias ficam fora do feed
+app.config['CALENDAR_FEED_PAST_DAYS'] = int(os.environ.get('CALENDAR_FEED_PAST_DAYS', 180))
+# Máximo de eventos por resposta da sincronização incremental
+app.config['CALENDAR_SYNC_LIMIT'] = int(os.environ.get('CALENDAR_SYNC_LIMIT', 500))
+# Eventos recorrentes: expansões memorizadas por regra/janela, limite de ocorrências por
+# expansão e horizonte usado quando a janela pedida não tem fim
+app.config['RECURRENCE_CACHE_SIZE'] = int(os.environ.get('RECURRENCE_CACHE_SIZE', 4096))
+app.config['RECURRENCE_MAX_OCCURRENCES'] = int(os.environ.get('RECURRENCE_MAX_OCCURRENCES', 1000))
+app.config['RECURRENCE_HORIZON_DAYS'] = int(os.environ.get('RECURRENCE_HORIZON_DAYS', 365))
+
+app.config['NOTIFICATIONS_PER_PAGE'] = int(os.environ.get('NOTIFICATIONS_PER_PAGE', 20))
+app.config['NOTIFICATION_RETENTION_DAYS'] = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 180))
+# 'background' envia notificações em lote por uma fila local; 'inline' envia na própria requisição
+app.config['NOTIFICATION_DISPATCH'] = os.environ.get('NOTIFICATION_DISPATCH', 'background')
+# Avisos para o stream SSE: 'local' (mesmo processo) ou 'postgres' (LISTEN/NOTIFY entre processos,
+# necessário quando o stream roda em workers gevent separados; ver gunicorn_sse.conf.py)
+app.config['NOTIFICATION_BROKER'] = os.environ.get('NOTIFICATION_BROKER', 'local')
+app.config['SSE_HEARTBEAT'] = int(os.environ.get('SSE_HEARTBEAT', 15))
+app.config['SSE_MAX_DURATION'] = int(os.environ.get('SSE_MAX_DURATION', 600))
+# URL do stream servido pelos workers gevent (p.ex. /notifications/stream, roteada para eles no
+# proxy). Vazio: as páginas não abrem o stream (cada conexão prenderia um worker síncrono) e o
+# contador de não lidas é consultado a cada NOTIFICATION_POLL_SECONDS
+app.config['NOTIFICATION_STREAM_URL'] = os.environ.get('NOTIFICATION_STREAM_URL', '')
+app.config['NOTIFICATION_POLL_SECONDS'] = int(os.environ.get('NOTIFICATION_POLL_SECONDS', 60))
+
+# Relatórios PDF gerados em um pool de processos. Por padrão não são gravados em REPORTS_DIR:
+# os bytes ficam no cache de saídas (CACHE_BACKEND; no máximo REPORT_OUTPUT_CACHE_SIZE com
+# 'memory') até o download. REPORT_CACHE_ENABLED=1 guarda os PDFs em REPORTS_DIR (fora de
+# /static); lotes (ZIP/PDF único) são sempre gravados lá
+app.config['REPORT_CACHE_ENABLED'] = os.environ.get('REPORT_CACHE_ENABLED', '0') == '1'
+app.config['REPORTS_DIR'] = os.environ.get('REPORTS_DIR', os.path.join(app.instance_path, 'reports'))
+app.config['REPORT_WORKERS'] = int(os.environ.get('REPORT_WORKERS', 2))
+app.config['REPORT_JOB_TTL'] = int(os.environ.get('REPORT_JOB_TTL', 3600))
+app.config['REPORT_OUTPUT_CACHE_SIZE'] = int(os.environ.get('REPORT_OUTPUT_CACHE_SIZE', 64))
+app.config['REPORT_CACHE_MAX_BYTES'] = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+app.config['REPORT_CACHE_MAX_AGE'] = int(os.environ.get('REPORT_CACHE_MAX_AGE', 7 * 24 * 3600))
+
+# Exportações em streaming: linhas lidas do cursor em lotes deste tamanho
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+# Cache do usuário da sessão (segundos); com CACHE_BACKEND=memory o snapshot não é guardado
+app.config['SESSION_USER_TTL'] = int(os.environ.get('SESSION_USER_TTL', 60))
 
-db = SQLAlchemy(app)
+# Diretório de usuários: paginação e limite da busca (typeahead)
+app.config['USERS_PER_PAGE'] = int(os.environ.get('USERS_PER_PAGE', 50))
+app.config['USER_SEARCH_LIMIT'] = int(os.environ.get('USER_SEARCH_LIMIT', 10))
+
+# Indicadores pré-calculados (utils/analytics.py)
+app.config['ATTENDANCE_THRESHOLD'] = float(os.environ.get('ATTENDANCE_THRESHOLD', 75.0))
+app.config['GRADE_BUCKET_WIDTH'] = float(os.environ.get('GRADE_BUCKET_WIDTH', 1.0))
+
+# Processos usados no hash das senhas na importação de CSV (padrão: número de CPUs)
+app.config['IMPORT_WORKERS'] = int(os.environ['IMPORT_WORKERS']) if os.environ.get('IMPORT_WORKERS') else None
+
+# Instrumentação por endpoint (utils/metrics.py): consultas acima de SLOW_QUERY_MS
+# vão para o log com a rota; 0 desativa. METRICS_TOKEN libera /admin/metrics para coletores
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+app.config['METRICS_WINDOW'] = int(os.environ.get('METRICS_WINDOW', 1024))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# Snapshots por worker (METRICS_DIR/<pid>.json, gravados a cada METRICS_FLUSH_SECONDS) para que
+# /admin/metrics mostre todos os processos; vazio mantém apenas as métricas do processo atual
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', os.path.join(app.instance_path, 'metrics'))
+app.config['METRICS_FLUSH_SECONDS'] = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+# Assets com hash no nome e pré-comprimidos (utils/assets.py), gerados por `flask build-assets`
+# no deploy, antes de subir os workers; eles só leem o manifesto (sem ele, servem de static/).
+# ASSETS_AUTOBUILD=1 gera na inicialização (desenvolvimento). O proxy serve ASSETS_DIR em
+# /assets/ direto do disco; ASSETS_URL aponta para uma CDN, se houver
+app.config['ASSETS_DIR'] = os.environ.get('ASSETS_DIR', os.path.join(app.static_folder, 'dist'))
+app.config['ASSETS_URL'] = os.environ.get('ASSETS_URL')
+app.config['ASSETS_AUTOBUILD'] = os.environ.get('ASSETS_AUTOBUILD', '0') == '1'
+
+from utils.db_routing import RoutingSession, init_db_routing
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+init_db_routing(app, db)
+# Esquema versionado em migrations/ (Alembic); criado/atualizado por `flask init-db` ou `flask db upgrade`
+migrate = Migrate(app, db, render_as_batch=True, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+from utils.metrics import init_metrics
+init_metrics(app)
+from utils.assets import init_assets
+init_assets(app)
+
 from models import User
 from routes import *
+import commands
+from utils.session_cache import load_session_user
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-with app.app_context():
-    db.create_all()
-
-    # Criar usuário admin inicial
-    if not User.query.filter_by(username='admin').first():
-        admin = User(
-            username='admin',
-            email='admin@escola.com',
-            role='admin'
-        )
-        admin.set_password('admin123')
-        db.session.add(admin)
-        db.session.commit()
\ No newline at end of file
+    # Snapshot em cache (SESSION_USER_TTL, só com backend compartilhado): a maioria das
+    # requisições não consulta o banco
+    return load_session_user(int(user_id))
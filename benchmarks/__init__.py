@@ -0,0 +1,4 @@
+# Benchmark das rotas com dados sintéticos. Uso:
+#   python -m benchmarks                       # SQLite temporário, todos os cenários
+#   python -m benchmarks --save-baseline       # grava benchmarks/baseline.json
+#   python -m benchmarks --database-url postgresql://... --scenario dashboard_teacher
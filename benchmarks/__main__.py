@@ -0,0 +1,148 @@
+import argparse
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmark das rotas do SIGA com dados sintéticos.'
+    )
+    parser.add_argument('--database-url',
+                        help='Banco vazio para o benchmark (p.ex. postgresql://...); padrão: SQLite temporário')
+    parser.add_argument('--replica-url', action='append', dest='replica_urls',
+                        help='Réplica de leitura para as rotas somente leitura (pode repetir)')
+    parser.add_argument('--reuse', action='store_true',
+                        help='Usa os dados de um seed anterior em --database-url em vez de semear de novo')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--courses', type=int, default=200)
+    parser.add_argument('--enrollments', type=int, default=20000)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--notifications', type=int, default=50000)
+    parser.add_argument('--scenario', action='append', dest='scenarios',
+                        help='Cenário a executar (pode repetir); padrão: todos')
+    parser.add_argument('--requests', type=int, default=200, help='Requisições medidas por cenário')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=2, help='Requisições de aquecimento por thread')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Grava os resultados como nova baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Piora relativa aceita (0.15 = 15%%)')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Sai com código 1 se alguma métrica piorar além da tolerância')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # O app lê a configuração do ambiente ao ser importado
+    tmpdir = tempfile.mkdtemp(prefix='siga-bench-')
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    # Cache novo a cada execução: versões gravadas por um benchmark anterior não valem para este banco
+    os.environ.setdefault('CACHE_DIR', os.path.join(tmpdir, 'cache'))
+    if args.replica_urls:
+        os.environ['DATABASE_REPLICA_URLS'] = ','.join(args.replica_urls)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('SLOW_QUERY_MS', '0')
+    # Um único processo: as métricas do runner vêm direto do registro, sem snapshots em disco
+    os.environ.setdefault('METRICS_DIR', '')
+    os.environ.setdefault('NOTIFICATION_DISPATCH', 'inline')
+
+    try:
+        return run(args)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def run(args):
+    from app import app, db
+    from flask_migrate import upgrade
+    from benchmarks.runner import compare, load_baseline, run_scenario, save_baseline
+    from benchmarks.scenarios import SCENARIOS
+    from benchmarks.seed import Dataset, seed_dataset
+
+    # O cliente de teste não envia o token CSRF do formulário de login
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Cenários desconhecidos: {', '.join(unknown)} (disponíveis: {', '.join(SCENARIOS)})", file=sys.stderr)
+        return 2
+
+    with app.app_context():
+        upgrade()
+        dataset = Dataset.load()
+        if args.reuse and dataset.users_by_role:
+            print('Reutilizando dados existentes')
+        elif dataset.users_by_role:
+            print('O banco já contém dados de benchmark; use --reuse ou um banco vazio', file=sys.stderr)
+            return 2
+        else:
+            print('Semeando dados sintéticos...')
+            dataset = seed_dataset(args.users, args.courses, args.enrollments, args.events,
+                                   args.notifications, seed=args.seed)
+        counts = dataset.counts()
+        dialect = db.engine.dialect.name
+    print(', '.join(f'{key}={value}' for key, value in counts.items()))
+
+    results = {}
+    header = f"{'cenário':<20} {'req':>6} {'erros':>6} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'SQL/req':>8}"
+    print(header)
+    print('-' * len(header))
+    for name in names:
+        result = run_scenario(app, SCENARIOS[name], dataset, requests=args.requests,
+                              concurrency=args.concurrency, warmup=args.warmup, seed=args.seed)
+        results[name] = result
+        print(f"{name:<20} {result['requests']:>6} {result['errors']:>6} {result['throughput']:>9.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p90_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+              f"{result['queries_per_request']:>8.1f}")
+
+    meta = {
+        'database': dialect,
+        'dataset': counts,
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'python': platform.python_version(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        baseline = load_baseline(args.baseline)
+        previous = baseline.get('meta', {})
+        if (previous.get('dataset'), previous.get('concurrency'), previous.get('database')) != \
+                (counts, args.concurrency, dialect):
+            print('\nAviso: a baseline foi gerada com outro banco, volume de dados ou concorrência')
+        print(f"\nComparação com a baseline de {previous.get('created_at', '?')}:")
+        for scenario, key, before, after, change, regressed in compare(results, baseline, args.tolerance):
+            flag = '  REGRESSÃO' if regressed else ''
+            print(f'{scenario:<20} {key:<20} {before:>10.2f} -> {after:>10.2f} ({change:+.1%}){flag}')
+            if regressed:
+                regressions.append((scenario, key))
+    elif not args.save_baseline:
+        print(f'\nSem baseline em {args.baseline}; use --save-baseline para criar')
+
+    if args.save_baseline:
+        save_baseline(args.baseline, meta, results)
+        print(f'\nBaseline gravada em {args.baseline}')
+
+    if any(result['errors'] for result in results.values()):
+        print('\nAviso: houve respostas com erro; os tempos desses cenários não são confiáveis')
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
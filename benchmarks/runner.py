@@ -0,0 +1,95 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import quantile
+from benchmarks.scenarios import login_as
+
+# Métricas comparadas com a baseline: (chave, maior é melhor)
+COMPARED = (
+    ('throughput', True),
+    ('p50_ms', False),
+    ('p90_ms', False),
+    ('p99_ms', False),
+    ('queries_per_request', False),
+)
+
+
+def run_scenario(app, scenario, dataset, requests=200, concurrency=4, warmup=2, seed=42):
+    users = dataset.users(scenario.role)
+    if not users:
+        raise ValueError(f'Nenhum usuário com papel {scenario.role!r} no banco de benchmark')
+
+    # Contadores de consultas vêm de utils/metrics.py; zerados quando todos terminam o aquecimento
+    registry = app.extensions['metrics']
+    barrier = threading.Barrier(concurrency, action=registry.reset)
+    shares = [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        user = users[index % len(users)]
+        client = app.test_client()
+        if scenario.login:
+            login_as(client, user[1])
+        for _ in range(warmup):
+            scenario.request(client, user, dataset, rng)
+        barrier.wait()
+
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(shares[index]):
+            request_started = time.perf_counter()
+            response = scenario.request(client, user, dataset, rng)
+            latencies.append(time.perf_counter() - request_started)
+            if response is None or response.status_code != scenario.expected_status:
+                errors += 1
+        return latencies, errors, started, time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    elapsed = max(result[3] for result in results) - min(result[2] for result in results)
+    queries = sum(totals['queries'] for _, totals, _, _ in registry.snapshot().values())
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(quantile(latencies, 0.5) * 1000, 2),
+        'p90_ms': round(quantile(latencies, 0.9) * 1000, 2),
+        'p99_ms': round(quantile(latencies, 0.99) * 1000, 2),
+        'queries_per_request': round(queries / len(latencies), 2) if latencies else 0.0,
+    }
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, meta, results):
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, tolerance=0.15):
+    # Variação relativa de cada métrica; piora acima da tolerância conta como regressão
+    rows = []
+    for name, current in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        for key, higher_is_better in COMPARED:
+            before, after = previous.get(key), current[key]
+            if not before:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            rows.append((name, key, before, after, change, worse > tolerance))
+    return rows
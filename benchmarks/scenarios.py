@@ -0,0 +1,89 @@
+import time
+from datetime import timedelta
+from benchmarks.seed import EPOCH, PASSWORD
+
+# Tempo máximo de espera por um job de PDF (segundos)
+REPORT_TIMEOUT = 120
+
+
+class Scenario:
+    # `request(client, user, dataset, rng)` faz uma iteração e devolve a resposta final
+    # (None quando a iteração falhou sem uma resposta HTTP, p.ex. job de PDF com erro)
+    def __init__(self, name, role, request, login=True, expected_status=200):
+        self.name = name
+        self.role = role
+        self.request = request
+        self.login = login
+        self.expected_status = expected_status
+
+
+def login_as(client, username):
+    return client.post('/login', data={'username': username, 'password': PASSWORD})
+
+
+def _login(client, user, dataset, rng):
+    # Cliente novo a cada iteração: com sessão ativa, /login só redireciona
+    return login_as(client.application.test_client(), user[1])
+
+
+def _dashboard(client, user, dataset, rng):
+    return client.get('/dashboard')
+
+
+def _events(client, user, dataset, rng):
+    # Janela de um mês, como o FullCalendar pede na visão mensal
+    start = EPOCH + timedelta(days=30 * rng.randrange(12))
+    return client.get('/calendar/events', query_string={
+        'start': start.isoformat(), 'end': (start + timedelta(days=42)).isoformat()
+    })
+
+
+def _grades(client, user, dataset, rng):
+    course_id = rng.choice(dataset.courses_by_teacher[user[0]])
+    return client.get(f'/teacher/grades/{course_id}')
+
+
+def _notifications(client, user, dataset, rng):
+    return client.get('/notifications')
+
+
+def _follow_report(client, response):
+    # Sem cache, a rota redireciona para o job; acompanha até o download, como a página de status
+    if response.status_code != 302:
+        return response
+    status_url = response.headers['Location']
+    deadline = time.monotonic() + REPORT_TIMEOUT
+    while time.monotonic() < deadline:
+        status = client.get(status_url, query_string={'format': 'json'}).get_json()
+        if status['status'] == 'done':
+            return client.get(status['download_url'])
+        if status['status'] == 'failed':
+            return None
+        time.sleep(0.02)
+    return None
+
+
+def _student_pdf(client, user, dataset, rng):
+    return _follow_report(client, client.get('/student/report/pdf'))
+
+
+def _course_pdf(client, user, dataset, rng):
+    course_id = rng.choice(dataset.courses_by_teacher[user[0]])
+    return _follow_report(client, client.get(f'/teacher/course/{course_id}/report/pdf'))
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        # Sucesso no login é um redirecionamento para o dashboard
+        Scenario('login', 'student', _login, login=False, expected_status=302),
+        Scenario('dashboard_admin', 'admin', _dashboard),
+        Scenario('dashboard_teacher', 'teacher', _dashboard),
+        Scenario('dashboard_student', 'student', _dashboard),
+        Scenario('get_events', 'student', _events),
+        Scenario('manage_grades', 'teacher', _grades),
+        Scenario('view_notifications', 'student', _notifications),
+        Scenario('student_pdf', 'student', _student_pdf),
+        Scenario('course_pdf', 'teacher', _course_pdf),
+    )
+}
@@ -0,0 +1,122 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select, update
+from werkzeug.security import generate_password_hash
+from app import db
+from models import User, Course, Enrollment, Event, Notification
+from utils.analytics import refresh_all_stats
+from utils.grade_history import record_enrollments
+
+# Senha de todos os usuários sintéticos (o hash é calculado uma única vez)
+PASSWORD = 'bench'
+BATCH_SIZE = 5000
+EPOCH = datetime(2025, 1, 1)
+
+
+class Dataset:
+    # Usuários sintéticos (id, username) por papel e cursos por professor, usados pelos cenários
+    def __init__(self, users_by_role, courses_by_teacher):
+        self.users_by_role = users_by_role
+        self.courses_by_teacher = courses_by_teacher
+
+    @classmethod
+    def load(cls):
+        users_by_role = {}
+        for user_id, username, role in db.session.execute(
+            select(User.id, User.username, User.role).where(User.email.like('%@bench.local')).order_by(User.id)
+        ):
+            users_by_role.setdefault(role, []).append((user_id, username))
+        courses_by_teacher = {}
+        for course_id, teacher_id in db.session.execute(select(Course.id, Course.teacher_id).order_by(Course.id)):
+            courses_by_teacher.setdefault(teacher_id, []).append(course_id)
+        return cls(users_by_role, courses_by_teacher)
+
+    def users(self, role):
+        # Professores sem cursos não servem para os cenários de notas e relatórios
+        users = self.users_by_role.get(role, [])
+        if role == 'teacher':
+            users = [user for user in users if user[0] in self.courses_by_teacher]
+        return users
+
+    def counts(self):
+        return {
+            'users': db.session.scalar(select(func.count(User.id))),
+            'courses': db.session.scalar(select(func.count(Course.id))),
+            'enrollments': db.session.scalar(select(func.count(Enrollment.id))),
+            'events': db.session.scalar(select(func.count(Event.id))),
+            'notifications': db.session.scalar(select(func.count(Notification.id))),
+        }
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def seed_dataset(users=2000, courses=200, enrollments=20000, events=5000, notifications=50000, seed=42):
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(PASSWORD)
+
+    # Um professor para cada 20 usuários; o restante são alunos
+    teacher_count = max(1, users // 20)
+    student_count = max(1, users - teacher_count)
+    _insert(User, [
+        {'name': 'Administrador (benchmark)', 'username': 'bench_admin', 'email': 'admin@bench.local',
+         'password_hash': password_hash, 'role': 'admin'}
+    ] + [
+        {'name': f'Professor {i}', 'username': f'prof{i}', 'email': f'prof{i}@bench.local',
+         'password_hash': password_hash, 'role': 'teacher'}
+        for i in range(teacher_count)
+    ] + [
+        {'name': f'Aluno {i}', 'username': f'aluno{i}', 'email': f'aluno{i}@bench.local',
+         'password_hash': password_hash, 'role': 'student'}
+        for i in range(student_count)
+    ])
+    teachers = db.session.scalars(select(User.id).where(User.role == 'teacher').order_by(User.id)).all()
+    students = db.session.scalars(select(User.id).where(User.role == 'student').order_by(User.id)).all()
+
+    _insert(Course, [
+        {'name': f'Curso {i:04d}', 'teacher_id': teachers[i % len(teachers)]}
+        for i in range(courses)
+    ])
+    course_ids = db.session.scalars(select(Course.id).order_by(Course.id)).all()
+
+    # Cursos distintos por aluno, distribuídos de forma uniforme
+    per_student = min(len(course_ids), max(1, enrollments // len(students)))
+    _insert(Enrollment, [
+        {'student_id': student_id, 'course_id': course_ids[(index * 31 + offset) % len(course_ids)],
+         'grade': round(rng.uniform(3, 10), 1) if rng.random() < 0.8 else None,
+         'attendance': round(rng.uniform(50, 100), 1)}
+        for index, student_id in enumerate(students)
+        for offset in range(per_student)
+    ])
+    record_enrollments(Enrollment.course_id.isnot(None))
+
+    event_rows = []
+    for i in range(events):
+        start = EPOCH + timedelta(days=rng.randrange(365), hours=rng.randrange(8, 18))
+        course_id = rng.choice(course_ids) if rng.random() < 0.9 else None
+        event_rows.append({
+            'title': f'Evento {i}', 'start_date': start, 'end_date': start + timedelta(hours=2),
+            'type': rng.choice(['aula', 'prova', 'evento']), 'course_id': course_id,
+            'created_by': teachers[0],
+        })
+    _insert(Event, event_rows)
+
+    now = datetime.utcnow()
+    _insert(Notification, [
+        {'user_id': rng.choice(students), 'title': f'Notificação {i}', 'message': 'Mensagem de teste',
+         'type': 'info', 'read': rng.random() < 0.7, 'created_at': now - timedelta(minutes=rng.randrange(525600))}
+        for i in range(notifications)
+    ])
+
+    # Mesmo cálculo de `flask reconcile-unread` e `flask refresh-analytics`
+    unread = (
+        select(func.count(Notification.id))
+        .where(Notification.user_id == User.id, Notification.read.is_(False))
+        .scalar_subquery()
+    )
+    db.session.execute(update(User).values(unread_notifications_count=unread))
+    db.session.commit()
+    refresh_all_stats()
+    return Dataset.load()
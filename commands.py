@@ -0,0 +1,128 @@
+import click
+import os
+from datetime import datetime, timedelta
+from flask_migrate import upgrade
+from sqlalchemy import delete, func, insert, literal, select, update
+from app import app, db
+from models import User, Notification, NotificationArchive
+from utils.csv_import import import_users, import_enrollments
+from utils.analytics import refresh_all_stats
+from utils.assets import build_assets
+from utils.session_cache import clear_session_cache
+
+
+@app.cli.command('init-db')
+def init_db():
+    """Aplica as migrações pendentes e cria o usuário admin inicial."""
+    # Executado uma vez por deploy, antes de subir os workers (que não tocam no esquema)
+    upgrade()
+    if not User.query.filter_by(username='admin').first():
+        admin = User(
+            name='Administrador',
+            username='admin',
+            email='admin@escola.com',
+            role='admin'
+        )
+        admin.set_password(os.environ.get('ADMIN_PASSWORD', 'admin123'))
+        db.session.add(admin)
+        db.session.commit()
+        click.echo('Usuário admin criado.')
+    click.echo('Banco de dados atualizado.')
+
+
+@app.cli.command('reconcile-unread')
+def reconcile_unread():
+    """Recalcula o contador de notificações não lidas de cada usuário."""
+    unread = (
+        select(func.count(Notification.id))
+        .where(Notification.user_id == User.id, Notification.read.is_(False))
+        .scalar_subquery()
+    )
+    result = db.session.execute(
+        update(User)
+        .where(User.unread_notifications_count != unread)
+        .values(unread_notifications_count=unread)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    clear_session_cache()
+    click.echo(f'{result.rowcount} contador(es) corrigido(s).')
+
+
+@app.cli.command('archive-notifications')
+@click.option('--days', type=int, default=None, help='Idade mínima, em dias, das notificações arquivadas.')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+def archive_notifications(days, batch_size):
+    """Move notificações lidas antigas para a tabela de arquivo."""
+    days = app.config['NOTIFICATION_RETENTION_DAYS'] if days is None else days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived_at = datetime.utcnow()
+    columns = ['id', 'user_id', 'title', 'message', 'type', 'read', 'created_at']
+    total = 0
+
+    # Lotes pequenos mantêm as transações (e os locks) curtos
+    while True:
+        ids = db.session.scalars(
+            select(Notification.id)
+            .where(Notification.read.is_(True), Notification.created_at < cutoff)
+            .order_by(Notification.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+
+        db.session.execute(
+            insert(NotificationArchive).from_select(
+                columns + ['archived_at'],
+                select(*[getattr(Notification, c) for c in columns], literal(archived_at))
+                .where(Notification.id.in_(ids))
+            )
+        )
+        db.session.execute(delete(Notification).where(Notification.id.in_(ids)))
+        db.session.commit()
+        total += len(ids)
+
+    click.echo(f'{total} notificação(ões) arquivada(s).')
+
+
+def _echo_import_result(result):
+    for line, reason in result.duplicates:
+        click.echo(f'linha {line}: duplicado ({reason})')
+    for line, reason in result.errors:
+        click.echo(f'linha {line}: erro ({reason})')
+    click.echo(
+        f'{result.created} criado(s), {len(result.duplicates)} duplicado(s), {len(result.errors)} erro(s).'
+    )
+
+
+@app.cli.command('import-users')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--chunk-size', type=int, default=500, show_default=True)
+@click.option('--workers', type=int, default=None, help='Processos para o hash das senhas.')
+def import_users_command(csv_file, chunk_size, workers):
+    """Importa usuários de um CSV (name,username,email,password,role)."""
+    _echo_import_result(import_users(csv_file, chunk_size=chunk_size, workers=workers))
+
+
+@app.cli.command('import-enrollments')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--chunk-size', type=int, default=1000, show_default=True)
+def import_enrollments_command(csv_file, chunk_size):
+    """Importa matrículas de um CSV (username,course_id)."""
+    _echo_import_result(import_enrollments(csv_file, chunk_size=chunk_size))
+
+
+@app.cli.command('refresh-analytics')
+def refresh_analytics():
+    """Recalcula os indicadores de todos os cursos e professores."""
+    refresh_all_stats()
+    click.echo('Indicadores atualizados.')
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Gera os assets estáticos com hash no nome e as versões comprimidas."""
+    # No deploy, antes de subir os workers, que só leem o manifesto (ASSETS_AUTOBUILD desligado)
+    manifest = build_assets(app.static_folder, app.config['ASSETS_DIR'])
+    for logical, hashed in sorted(manifest.items()):
+        click.echo(f'{logical} -> {hashed}')
@@ -1,6 +1,8 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SelectField, FloatField, SubmitField, TextAreaField, DateTimeField
-from wtforms.validators import DataRequired, Email, Length
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import StringField, PasswordField, SelectField, SubmitField, TextAreaField, DateTimeField, DateField, IntegerField
+from wtforms.widgets import HiddenInput
+from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -17,13 +19,13 @@ class UserForm(FlaskForm):
 
 class CourseForm(FlaskForm):
     name = StringField('Course Name', validators=[DataRequired()])
-    teacher_id = SelectField('Teacher', coerce=int)
+    # Preenchido pela busca (typeahead) em /admin/users/search
+    teacher_id = IntegerField('Teacher', validators=[DataRequired()], widget=HiddenInput())
     submit = SubmitField('Submit')
 
-class GradeForm(FlaskForm):
-    grade = FloatField('Grade', validators=[DataRequired()])
-    attendance = FloatField('Attendance %', validators=[DataRequired()])
-    submit = SubmitField('Submit')
+class BulkGradeForm(FlaskForm):
+    # Apenas o token CSRF: as linhas da planilha são validadas em utils/gradebook.py
+    submit = SubmitField('Save All')
 
 class EventForm(FlaskForm):
     title = StringField('Event Title', validators=[DataRequired()])
@@ -37,8 +39,46 @@ class EventForm(FlaskForm):
         ('evento', 'Evento Geral')
     ])
     course_id = SelectField('Course', coerce=int)
+    # Frequências simples; a regra gravada (RRULE) aceita também BYDAY, INTERVAL etc.
+    recurrence = SelectField('Repeat', choices=[
+        ('', 'Não repete'),
+        ('DAILY', 'Diariamente'),
+        ('WEEKLY', 'Semanalmente'),
+        ('MONTHLY', 'Mensalmente')
+    ])
+    recurrence_until = DateField('Repeat Until', validators=[Optional()])
+    # Alternativa à data final; o máximo (RECURRENCE_MAX_OCCURRENCES) é conferido na rota
+    recurrence_count = IntegerField('Occurrences', validators=[Optional(), NumberRange(min=1)])
     submit = SubmitField('Submit')
 
+class OccurrenceForm(FlaskForm):
+    title = StringField('Event Title', validators=[DataRequired()])
+    description = TextAreaField('Description')
+    start_date = DateTimeField('Start Date', validators=[DataRequired()], format='%Y-%m-%dT%H:%M')
+    end_date = DateTimeField('End Date', validators=[DataRequired()], format='%Y-%m-%dT%H:%M')
+    submit = SubmitField('Salvar ocorrência')
+    cancel_occurrence = SubmitField('Cancelar ocorrência')
+    restore = SubmitField('Restaurar')
+
 class EnrollmentForm(FlaskForm):
-    student_id = SelectField('Student', coerce=int, validators=[DataRequired()])
-    submit = SubmitField('Enroll Student')
\ No newline at end of file
+    student_id = IntegerField('Student', validators=[DataRequired()], widget=HiddenInput())
+    submit = SubmitField('Enroll Student')
+
+class ReportExportForm(FlaskForm):
+    course_id = SelectField('Curso', coerce=int)
+    format = SelectField('Formato', choices=[
+        ('zip', 'ZIP (um PDF por aluno)'),
+        ('pdf', 'PDF único')
+    ])
+    submit = SubmitField('Exportar')
+
+class ImportForm(FlaskForm):
+    kind = SelectField('Tipo', choices=[
+        ('users', 'Usuários (name,username,email,password,role)'),
+        ('enrollments', 'Matrículas (username,course_id)')
+    ])
+    csv_file = FileField('Arquivo CSV', validators=[FileRequired(), FileAllowed(['csv'], 'Envie um arquivo .csv')])
+    submit = SubmitField('Importar')
+
+class CalendarFeedForm(FlaskForm):
+    submit = SubmitField('Gerar novo link')
@@ -0,0 +1,40 @@
+# Workers gevent para o stream de notificações (/notifications/stream).
+#
+# Cada conexão SSE aberta fica parada esperando avisos; em um worker síncrono isso ocuparia o
+# worker inteiro. Aqui (worker_class = 'gevent') milhares de conexões ociosas custam apenas um
+# greenlet cada. É uma implantação à parte, ao lado dos workers síncronos do app:
+#
+#   gunicorn -w 4 main:app                      # páginas (workers síncronos, porta 5000)
+#   gunicorn -c gunicorn_sse.conf.py main:app   # só o stream (gevent, SSE_BIND)
+#
+# e no proxy reverso só a rota do stream vai para cá, sem buffer:
+#
+#   location /notifications/stream {
+#       proxy_pass http://127.0.0.1:5001;
+#       proxy_buffering off;
+#       proxy_read_timeout 1h;
+#   }
+#
+# As páginas só abrem o stream com NOTIFICATION_STREAM_URL=/notifications/stream (nos dois
+# grupos de workers); sem isso o navegador apenas consulta o contador de não lidas. Com
+# processos separados use também NOTIFICATION_BROKER=postgres, para que os avisos gravados
+# pelos workers síncronos cheguem a estes (LISTEN/NOTIFY).
+import os
+
+bind = os.environ.get('SSE_BIND', '0.0.0.0:5001')
+worker_class = 'gevent'
+workers = int(os.environ.get('SSE_WORKERS', 1))
+worker_connections = int(os.environ.get('SSE_WORKER_CONNECTIONS', 5000))
+# Em workers gevent o timeout vale para o processo (heartbeat do worker), não para cada stream
+timeout = int(os.environ.get('SSE_TIMEOUT', 60))
+keepalive = 75
+
+
+def post_fork(server, worker):
+    # psycopg2 só coopera com o gevent com os hooks do psycogreen
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen não instalado: consultas ao PostgreSQL bloquearão o worker gevent')
+    else:
+        patch_psycopg()
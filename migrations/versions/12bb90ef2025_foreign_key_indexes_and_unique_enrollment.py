@@ -0,0 +1,49 @@
+"""foreign key indexes and unique enrollment
+
+Revision ID: 12bb90ef2025
+Revises: fa07e1e3ad7d
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '12bb90ef2025'
+down_revision = 'fa07e1e3ad7d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Matrículas duplicadas (mesmo aluno e curso) impediriam o índice único. Não há como saber
+    # qual linha vale (notas e frequências podem divergir), então a migração para e lista os
+    # pares; depois de resolvê-los, rode `flask db upgrade` de novo e `flask refresh-analytics`.
+    enrollment = sa.table('enrollment', sa.column('id'), sa.column('student_id'), sa.column('course_id'))
+    duplicates = op.get_bind().execute(
+        sa.select(enrollment.c.student_id, enrollment.c.course_id, sa.func.count(enrollment.c.id))
+        .where(enrollment.c.student_id.isnot(None), enrollment.c.course_id.isnot(None))
+        .group_by(enrollment.c.student_id, enrollment.c.course_id)
+        .having(sa.func.count(enrollment.c.id) > 1)
+        .order_by(enrollment.c.student_id, enrollment.c.course_id)
+    ).all()
+    if duplicates:
+        pairs = '\n'.join(
+            f'  student_id={student_id} course_id={course_id} ({count} matrículas)'
+            for student_id, course_id, count in duplicates
+        )
+        raise RuntimeError(
+            f'{len(duplicates)} par(es) (student_id, course_id) com matrícula duplicada; '
+            f'remova as linhas excedentes da tabela enrollment antes de migrar:\n{pairs}'
+        )
+
+    op.create_index('uq_enrollment_student_course', 'enrollment', ['student_id', 'course_id'], unique=True)
+    op.create_index('ix_enrollment_course_id', 'enrollment', ['course_id'])
+    op.create_index(op.f('ix_course_teacher_id'), 'course', ['teacher_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_course_teacher_id'), table_name='course')
+    op.drop_index('ix_enrollment_course_id', table_name='enrollment')
+    op.drop_index('uq_enrollment_student_course', table_name='enrollment')
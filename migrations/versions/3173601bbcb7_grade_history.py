@@ -0,0 +1,58 @@
+"""grade history
+
+Revision ID: 3173601bbcb7
+Revises: df1628a0e410
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3173601bbcb7'
+down_revision = 'df1628a0e410'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('grade_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('enrollment_id', sa.Integer(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(length=10), nullable=False),
+    sa.Column('old_grade', sa.Float(), nullable=True),
+    sa.Column('grade', sa.Float(), nullable=True),
+    sa.Column('old_attendance', sa.Float(), nullable=True),
+    sa.Column('attendance', sa.Float(), nullable=True),
+    sa.Column('changed_by', sa.Integer(), nullable=True),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['changed_by'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['course_id'], ['course.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_grade_history_course_changed', 'grade_history', ['course_id', 'changed_at'], unique=False)
+    op.create_index('ix_grade_history_enrollment_changed', 'grade_history', ['enrollment_id', 'changed_at'], unique=False)
+
+    # O histórico começa na migração: o estado atual de cada matrícula vira o registro inicial,
+    # datado em UTC como os registros gravados pelo app (datetime.utcnow)
+    enrollment = sa.table('enrollment', sa.column('id'), sa.column('course_id'), sa.column('student_id'),
+                          sa.column('grade'), sa.column('attendance'))
+    history = sa.table('grade_history', sa.column('enrollment_id'), sa.column('course_id'), sa.column('student_id'),
+                       sa.column('action'), sa.column('grade'), sa.column('attendance'), sa.column('changed_at'))
+    op.execute(history.insert().from_select(
+        ['enrollment_id', 'course_id', 'student_id', 'action', 'grade', 'attendance', 'changed_at'],
+        sa.select(enrollment.c.id, enrollment.c.course_id, enrollment.c.student_id, sa.literal('enroll'),
+                  enrollment.c.grade, enrollment.c.attendance, sa.literal(datetime.utcnow(), sa.DateTime()))
+        .where(enrollment.c.course_id.isnot(None), enrollment.c.student_id.isnot(None))
+    ))
+
+
+def downgrade():
+    op.drop_index('ix_grade_history_enrollment_changed', table_name='grade_history')
+    op.drop_index('ix_grade_history_course_changed', table_name='grade_history')
+    op.drop_table('grade_history')
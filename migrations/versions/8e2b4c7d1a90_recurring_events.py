@@ -0,0 +1,48 @@
+"""recurring events
+
+Revision ID: 8e2b4c7d1a90
+Revises: 3173601bbcb7
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2b4c7d1a90'
+down_revision = '3173601bbcb7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('recurrence_rule', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('recurrence_end', sa.DateTime(), nullable=True))
+
+    op.create_table('event_override',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('original_start', sa.DateTime(), nullable=False),
+    sa.Column('cancelled', sa.Boolean(), nullable=False),
+    sa.Column('title', sa.String(length=100), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('start_date', sa.DateTime(), nullable=True),
+    sa.Column('end_date', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('event_override', schema=None) as batch_op:
+        batch_op.create_index('uq_event_override_occurrence', ['event_id', 'original_start'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('event_override', schema=None) as batch_op:
+        batch_op.drop_index('uq_event_override_occurrence')
+
+    op.drop_table('event_override')
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_column('recurrence_end')
+        batch_op.drop_column('recurrence_rule')
@@ -0,0 +1,52 @@
+"""event sync versions and tombstones
+
+Revision ID: b5d3e9f14c62
+Revises: 8e2b4c7d1a90
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d3e9f14c62'
+down_revision = '8e2b4c7d1a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_counter',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(sa.table('sync_counter', sa.column('name'), sa.column('value')), [{'name': 'event', 'value': 0}])
+
+    op.create_table('event_tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=True),
+    sa.Column('sync_version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_event_tombstone_sync_version'), 'event_tombstone', ['sync_version'], unique=False)
+
+    # Eventos existentes ficam na versão 0: entram na primeira sincronização completa de cada cliente.
+    # Versões antigas (updated_at_id) deixam de valer; os clientes recebem 400 e recomeçam.
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sync_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.drop_index('ix_event_updated_id')
+        batch_op.create_index('ix_event_sync_version_id', ['sync_version', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_sync_version_id')
+        batch_op.create_index('ix_event_updated_id', ['updated_at', 'id'], unique=False)
+        batch_op.drop_column('sync_version')
+
+    op.drop_index(op.f('ix_event_tombstone_sync_version'), table_name='event_tombstone')
+    op.drop_table('event_tombstone')
+    op.drop_table('sync_counter')
@@ -0,0 +1,42 @@
+"""calendar feed token and event versions
+
+Revision ID: df1628a0e410
+Revises: 12bb90ef2025
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'df1628a0e410'
+down_revision = '12bb90ef2025'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('calendar_token', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_user_calendar_token'), ['calendar_token'], unique=True)
+
+    # Eventos existentes entram na sincronização com a data da migração, em UTC como as gravadas
+    # pelo app (datetime.utcnow); current_timestamp seria a hora local do servidor
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute(sa.table('event', sa.column('updated_at', sa.DateTime())).update().values(updated_at=datetime.utcnow()))
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_event_updated_id', ['updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_updated_id')
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_calendar_token'))
+        batch_op.drop_column('calendar_token')
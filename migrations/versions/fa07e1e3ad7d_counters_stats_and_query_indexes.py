@@ -0,0 +1,201 @@
+"""counters, stats tables and query indexes
+
+Revision ID: fa07e1e3ad7d
+Revises: 569699bb864b
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+import math
+from datetime import datetime
+from itertools import groupby
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fa07e1e3ad7d'
+down_revision = '569699bb864b'
+branch_labels = None
+depends_on = None
+
+
+# Antes das migrações, db.create_all() já criava as tabelas novas ao iniciar o app;
+# só cria o que ainda não existe para que bancos antigos possam ser atualizados.
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _create_index(name, table, columns, **kw):
+    op.create_index(name, table, columns, if_not_exists=True, **kw)
+
+
+def _lower_index(name, column):
+    # Índice em lower(coluna) com text_pattern_ops no PostgreSQL (busca por prefixo com LIKE)
+    expression = sa.func.lower(sa.column(column)).label(f'{column}_lower')
+    _create_index(name, 'user', [expression], postgresql_ops={f'{column}_lower': 'text_pattern_ops'})
+
+
+def _summary(rows, threshold, width):
+    # Mesmo resultado de utils/analytics._compute, sobre (nota, frequência) já carregados
+    grades = sorted(grade for grade, _ in rows if grade is not None)
+    attendances = [attendance for _, attendance in rows if attendance is not None]
+    distribution = {}
+    for grade in grades:
+        key = str(math.floor(grade / width) * width)
+        distribution[key] = distribution.get(key, 0) + 1
+    middle = grades[(len(grades) - 1) // 2:len(grades) // 2 + 1]
+    return {
+        'student_count': len(rows),
+        'graded_count': len(grades),
+        'mean_grade': sum(grades) / len(grades) if grades else None,
+        'median_grade': sum(middle) / len(middle) if middle else None,
+        'mean_attendance': sum(attendances) / len(attendances) if attendances else None,
+        'at_risk_count': sum(1 for attendance in attendances if attendance < threshold),
+        'grade_distribution': distribution,
+        'updated_at': datetime.utcnow(),
+    }
+
+
+def _backfill_stats():
+    # Preenche os resumos dos cursos (e professores) que ainda não têm linha; sem isso o
+    # painel e os PDFs ficam vazios até a próxima gravação de notas (`flask refresh-analytics`)
+    threshold = current_app.config.get('ATTENDANCE_THRESHOLD', 75.0)
+    width = current_app.config.get('GRADE_BUCKET_WIDTH', 1.0)
+    bind = op.get_bind()
+    course = sa.table('course', sa.column('id'), sa.column('teacher_id'))
+    enrollment = sa.table('enrollment', sa.column('id'), sa.column('course_id'), sa.column('grade'), sa.column('attendance'))
+    course_stats = sa.table(
+        'course_stats', sa.column('course_id'), sa.column('student_count'), sa.column('graded_count'),
+        sa.column('mean_grade'), sa.column('median_grade'), sa.column('mean_attendance'),
+        sa.column('at_risk_count'), sa.column('grade_distribution', sa.JSON()), sa.column('updated_at')
+    )
+    teacher_stats = sa.table(
+        'teacher_stats', sa.column('teacher_id'), sa.column('course_count'), sa.column('student_count'),
+        sa.column('graded_count'), sa.column('mean_grade'), sa.column('median_grade'),
+        sa.column('mean_attendance'), sa.column('at_risk_count'),
+        sa.column('grade_distribution', sa.JSON()), sa.column('updated_at')
+    )
+
+    rows = bind.execute(
+        sa.select(course.c.id, course.c.teacher_id, enrollment.c.id.label('enrollment_id'),
+                  enrollment.c.grade, enrollment.c.attendance)
+        .select_from(course.outerjoin(enrollment, enrollment.c.course_id == course.c.id))
+        .order_by(course.c.teacher_id, course.c.id)
+    ).all()
+    existing_courses = set(bind.scalars(sa.select(course_stats.c.course_id)))
+    existing_teachers = set(bind.scalars(sa.select(teacher_stats.c.teacher_id)))
+
+    course_rows, teacher_rows = [], []
+    for teacher_id, teacher_group in groupby(rows, key=lambda row: row.teacher_id):
+        teacher_group = list(teacher_group)
+        # Cursos sem matrícula aparecem uma vez (outer join), sem enrollment_id
+        enrolled = [row for row in teacher_group if row.enrollment_id is not None]
+        for course_id, course_group in groupby(teacher_group, key=lambda row: row.id):
+            if course_id not in existing_courses:
+                course_enrolled = [(row.grade, row.attendance) for row in course_group if row.enrollment_id is not None]
+                course_rows.append(dict(_summary(course_enrolled, threshold, width), course_id=course_id))
+        if teacher_id is not None and teacher_id not in existing_teachers:
+            teacher_rows.append(dict(
+                _summary([(row.grade, row.attendance) for row in enrolled], threshold, width),
+                teacher_id=teacher_id, course_count=len({row.id for row in enrolled})
+            ))
+
+    if course_rows:
+        op.bulk_insert(course_stats, course_rows)
+    if teacher_rows:
+        op.bulk_insert(teacher_stats, teacher_rows)
+
+
+def upgrade():
+    if not _has_column('user', 'unread_notifications_count'):
+        with op.batch_alter_table('user', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('unread_notifications_count', sa.Integer(), server_default='0', nullable=False))
+
+        # Mesmo cálculo de `flask reconcile-unread`
+        user = sa.table('user', sa.column('id'), sa.column('unread_notifications_count'))
+        notification = sa.table('notification', sa.column('id'), sa.column('user_id'), sa.column('read'))
+        unread = (
+            sa.select(sa.func.count(notification.c.id))
+            .where(notification.c.user_id == user.c.id, notification.c.read.is_(False))
+            .scalar_subquery()
+        )
+        op.execute(user.update().values(unread_notifications_count=unread))
+
+    _lower_index('ix_user_name_lower', 'name')
+    _lower_index('ix_user_username_lower', 'username')
+    _lower_index('ix_user_email_lower', 'email')
+    _create_index('ix_user_name_id', 'user', ['name', 'id'])
+    _create_index('ix_event_course_window', 'event', ['course_id', 'start_date', 'end_date'])
+    _create_index('ix_event_window', 'event', ['start_date', 'end_date'])
+    _create_index('ix_notification_user_read_created', 'notification', ['user_id', 'read', 'created_at'])
+    _create_index('ix_notification_user_created_id', 'notification', ['user_id', 'created_at', 'id'])
+
+    if not _has_table('notification_archive'):
+        op.create_table('notification_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=True),
+        sa.Column('read', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    _create_index('ix_notification_archive_user_id', 'notification_archive', ['user_id'])
+
+    if not _has_table('course_stats'):
+        op.create_table('course_stats',
+        sa.Column('course_id', sa.Integer(), nullable=False),
+        sa.Column('student_count', sa.Integer(), nullable=False),
+        sa.Column('graded_count', sa.Integer(), nullable=False),
+        sa.Column('mean_grade', sa.Float(), nullable=True),
+        sa.Column('median_grade', sa.Float(), nullable=True),
+        sa.Column('mean_attendance', sa.Float(), nullable=True),
+        sa.Column('at_risk_count', sa.Integer(), nullable=False),
+        sa.Column('grade_distribution', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['course_id'], ['course.id'], ),
+        sa.PrimaryKeyConstraint('course_id')
+        )
+
+    if not _has_table('teacher_stats'):
+        op.create_table('teacher_stats',
+        sa.Column('teacher_id', sa.Integer(), nullable=False),
+        sa.Column('course_count', sa.Integer(), nullable=False),
+        sa.Column('student_count', sa.Integer(), nullable=False),
+        sa.Column('graded_count', sa.Integer(), nullable=False),
+        sa.Column('mean_grade', sa.Float(), nullable=True),
+        sa.Column('median_grade', sa.Float(), nullable=True),
+        sa.Column('mean_attendance', sa.Float(), nullable=True),
+        sa.Column('at_risk_count', sa.Integer(), nullable=False),
+        sa.Column('grade_distribution', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['teacher_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('teacher_id')
+        )
+
+    _backfill_stats()
+
+
+def downgrade():
+    op.drop_table('teacher_stats')
+    op.drop_table('course_stats')
+    op.drop_index('ix_notification_archive_user_id', table_name='notification_archive')
+    op.drop_table('notification_archive')
+    op.drop_index('ix_notification_user_created_id', table_name='notification')
+    op.drop_index('ix_notification_user_read_created', table_name='notification')
+    op.drop_index('ix_event_window', table_name='event')
+    op.drop_index('ix_event_course_window', table_name='event')
+    op.drop_index('ix_user_name_id', table_name='user')
+    op.drop_index('ix_user_email_lower', table_name='user')
+    op.drop_index('ix_user_username_lower', table_name='user')
+    op.drop_index('ix_user_name_lower', table_name='user')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications_count')
@@ -10,12 +10,27 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
     role = db.Column(db.String(20), nullable=False)  # admin, teacher, student
+    # Contador desnormalizado; recalculado apenas por `flask reconcile-unread`
+    unread_notifications_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Token secreto da assinatura ICS (/calendar/feed/<token>.ics); gerado sob demanda
+    calendar_token = db.Column(db.String(64), unique=True, index=True)
 
     # Adicionar relacionamentos
     courses_teaching = db.relationship('Course', backref='teacher', lazy=True)
     enrollments = db.relationship('Enrollment', backref='student', lazy=True)
     notifications = db.relationship('Notification', backref='user', lazy=True)
 
+    # Índices para a busca por prefixo no diretório de usuários (text_pattern_ops atende LIKE 'x%' no PostgreSQL)
+    __table_args__ = (
+        db.Index('ix_user_name_lower', db.func.lower(name).label('name_lower'),
+                 postgresql_ops={'name_lower': 'text_pattern_ops'}),
+        db.Index('ix_user_username_lower', db.func.lower(username).label('username_lower'),
+                 postgresql_ops={'username_lower': 'text_pattern_ops'}),
+        db.Index('ix_user_email_lower', db.func.lower(email).label('email_lower'),
+                 postgresql_ops={'email_lower': 'text_pattern_ops'}),
+        db.Index('ix_user_name_id', name, id),
+    )
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -25,7 +40,7 @@ class User(UserMixin, db.Model):
 class Course(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     students = db.relationship('Enrollment', back_populates='course')
 
 class Enrollment(db.Model):
@@ -37,6 +52,33 @@ class Enrollment(db.Model):
 
     course = db.relationship('Course', back_populates='students')
 
+    # Uma matrícula por aluno e curso; o índice único também atende as buscas por student_id
+    __table_args__ = (
+        db.Index('uq_enrollment_student_course', 'student_id', 'course_id', unique=True),
+        db.Index('ix_enrollment_course_id', 'course_id'),
+    )
+
+class GradeHistory(db.Model):
+    # Histórico append-only de matrículas e notas, gravado na mesma transação da alteração.
+    # enrollment_id sem chave estrangeira: o histórico sobrevive à remoção da matrícula.
+    id = db.Column(db.Integer, primary_key=True)
+    enrollment_id = db.Column(db.Integer, nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # enroll, update, remove
+    old_grade = db.Column(db.Float)
+    grade = db.Column(db.Float)
+    old_attendance = db.Column(db.Float)
+    attendance = db.Column(db.Float)
+    changed_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # (enrollment_id, changed_at): histórico de uma matrícula; (course_id, changed_at): consulta "as of" do curso
+    __table_args__ = (
+        db.Index('ix_grade_history_enrollment_changed', 'enrollment_id', 'changed_at'),
+        db.Index('ix_grade_history_course_changed', 'course_id', 'changed_at'),
+    )
+
 class Event(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -46,9 +88,57 @@ class Event(db.Model):
     type = db.Column(db.String(50))  # aula, prova, feriado, etc
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'))
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Versão usada na sincronização incremental (/calendar/events/changes), atribuída em
+    # utils/calendar_feed na ordem dos commits; 0 para linhas inseridas fora do ORM
+    sync_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Regra RRULE (RFC 5545, sem o prefixo "RRULE:"); start_date/end_date são a primeira ocorrência
+    recurrence_rule = db.Column(db.String(255))
+    # Fim da última ocorrência, para o filtro por janela; nulo quando a série não tem fim
+    recurrence_end = db.Column(db.DateTime)
 
     course = db.relationship('Course')
     creator = db.relationship('User')
+    overrides = db.relationship('EventOverride', backref='event', lazy=True, cascade='all, delete-orphan')
+
+    # Índices para a consulta por janela de datas do calendário
+    # (ix_event_course_window começa por course_id e cobre a chave estrangeira)
+    __table_args__ = (
+        db.Index('ix_event_course_window', 'course_id', 'start_date', 'end_date'),
+        db.Index('ix_event_window', 'start_date', 'end_date'),
+        db.Index('ix_event_sync_version_id', 'sync_version', 'id'),
+    )
+
+class EventOverride(db.Model):
+    # Exceção de uma ocorrência de evento recorrente: cancelada ou com outros dados.
+    # Campos nulos herdam os valores da série.
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    original_start = db.Column(db.DateTime, nullable=False)
+    cancelled = db.Column(db.Boolean, nullable=False, default=False)
+    title = db.Column(db.String(100))
+    description = db.Column(db.Text)
+    start_date = db.Column(db.DateTime)
+    end_date = db.Column(db.DateTime)
+
+    # Uma exceção por ocorrência; o índice também cobre a chave estrangeira
+    __table_args__ = (
+        db.Index('uq_event_override_occurrence', 'event_id', 'original_start', unique=True),
+    )
+
+class EventTombstone(db.Model):
+    # Evento removido da visão de um escopo (apagado ou movido para outro curso): a sincronização
+    # incremental informa o id aos clientes que o tinham
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, nullable=False)
+    course_id = db.Column(db.Integer)  # curso anterior; nulo para evento geral
+    sync_version = db.Column(db.Integer, nullable=False, index=True)
+
+class SyncCounter(db.Model):
+    # Contador da versão de sincronização: o UPDATE trava a linha até o commit, então as
+    # versões ficam na mesma ordem dos commits
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
 
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -57,4 +147,49 @@ class Notification(db.Model):
     message = db.Column(db.Text, nullable=False)
     type = db.Column(db.String(50))  # info, warning, success, danger
     read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Ambos começam por user_id e cobrem a chave estrangeira
+    __table_args__ = (
+        db.Index('ix_notification_user_read_created', 'user_id', 'read', 'created_at'),
+        db.Index('ix_notification_user_created_id', 'user_id', 'created_at', 'id'),
+    )
+
+class NotificationArchive(db.Model):
+    # Notificações lidas antigas, movidas para fora da tabela quente por `flask archive-notifications`
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    title = db.Column(db.String(100), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    type = db.Column(db.String(50))
+    read = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CourseStats(db.Model):
+    # Resumo pré-calculado por utils/analytics.py, atualizado a cada gravação de notas
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    student_count = db.Column(db.Integer, nullable=False, default=0)
+    graded_count = db.Column(db.Integer, nullable=False, default=0)
+    mean_grade = db.Column(db.Float)
+    median_grade = db.Column(db.Float)
+    mean_attendance = db.Column(db.Float)
+    at_risk_count = db.Column(db.Integer, nullable=False, default=0)  # frequência abaixo do limite
+    grade_distribution = db.Column(db.JSON)  # {início da faixa: quantidade}
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    course = db.relationship('Course', backref=db.backref('stats', uselist=False))
+
+class TeacherStats(db.Model):
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    course_count = db.Column(db.Integer, nullable=False, default=0)
+    student_count = db.Column(db.Integer, nullable=False, default=0)
+    graded_count = db.Column(db.Integer, nullable=False, default=0)
+    mean_grade = db.Column(db.Float)
+    median_grade = db.Column(db.Float)
+    mean_attendance = db.Column(db.Float)
+    at_risk_count = db.Column(db.Integer, nullable=False, default=0)
+    grade_distribution = db.Column(db.JSON)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    teacher = db.relationship('User')
@@ -1,12 +1,35 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, send_from_directory
+from flask import render_template, redirect, url_for, flash, request, jsonify, send_file, send_from_directory, abort, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from app import app, db
-from models import User, Course, Enrollment, Event, Notification
-from forms import LoginForm, UserForm, CourseForm, GradeForm, EventForm, EnrollmentForm
+from models import User, Course, Enrollment, Event, EventOverride, Notification, CourseStats, TeacherStats
+from forms import LoginForm, UserForm, CourseForm, EventForm, OccurrenceForm, EnrollmentForm, ReportExportForm, BulkGradeForm, ImportForm, CalendarFeedForm
 from utils.pdf_generator import PDFGenerator
+from utils.csv_import import ROLES, import_users, import_enrollments
+from utils.analytics import current_course_stats, refresh_stats_for_course
+from utils.gradebook import GradebookError, apply_grade_rows, rows_from_form
+from utils.grade_history import enrollment_change, gradebook_as_of, record_enrollments, record_grade_changes
+from utils.queries import course_enrollments, student_enrollments, program_enrollments, courses_with_student_counts, gradebook_export_query, users_page, search_users
+from utils.exports import GRADEBOOK_HEADER, csv_stream, xlsx_stream
+from utils.report_jobs import get_report_jobs
+from utils.report_cache import get_report_cache
+from utils.notifications import adjust_unread_count, notify_course, dispatch
+from utils.session_cache import unread_notifications_count
+from utils.notification_stream import latest_notification_id, notification_events
+from utils.recurrence import build_rule, exceeds_max_occurrences, is_occurrence, rule_form_fields, set_recurrence
+from utils.calendar_feed import parse_window_bound, cached_events_payload, invalidate_event_scopes, feed_user, rotate_calendar_token, feed_etag, ics_stream, event_changes
+from utils.metrics import get_metrics
+from utils.db_routing import read_only
 from functools import wraps
 from datetime import datetime
-import os
+from io import BytesIO
+import io
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from itertools import groupby
+from werkzeug.utils import secure_filename
+from werkzeug.exceptions import NotFound
+import hmac
 
 def role_required(role):
     def decorator(f):
@@ -42,17 +65,31 @@ def logout():
 @app.context_processor
 def inject_unread_notifications():
     if current_user.is_authenticated:
-        unread_count = Notification.query.filter_by(
-            user_id=current_user.id, 
-            read=False
-        ).count()
-        return {'unread_notifications_count': unread_count}
+        # Contador desnormalizado em User, mantido pelas rotas de notificação (em cache)
+        return {'unread_notifications_count': unread_notifications_count(current_user.id)}
     return {'unread_notifications_count': 0}
 
 @app.route('/dashboard')
+@read_only
 @login_required
 def dashboard():
-    return render_template('dashboard.html')
+    course_stats = teacher_stats = teaching = None
+    if current_user.role == 'admin':
+        # Leitura dos resumos pré-calculados: sem agregação na renderização
+        course_stats = CourseStats.query.options(
+            joinedload(CourseStats.course).joinedload(Course.teacher)
+        ).order_by(CourseStats.course_id).all()
+        teacher_stats = TeacherStats.query.options(
+            joinedload(TeacherStats.teacher)
+        ).order_by(TeacherStats.teacher_id).all()
+    elif current_user.role == 'teacher':
+        teaching = Course.query.filter_by(teacher_id=current_user.id).order_by(Course.name).all()
+        course_stats = CourseStats.query.join(Course).options(
+            joinedload(CourseStats.course)
+        ).filter(Course.teacher_id == current_user.id).order_by(CourseStats.course_id).all()
+    return render_template(
+        'dashboard.html', course_stats=course_stats, teacher_stats=teacher_stats, teaching=teaching
+    )
 
 @app.route('/admin/users', methods=['GET', 'POST'])
 @login_required
@@ -72,28 +109,86 @@ def manage_users():
         flash('User created successfully', 'success')
         return redirect(url_for('manage_users'))
 
-    users = User.query.all()
-    return render_template('admin/users.html', users=users, form=form)
+    query = request.args.get('q', '').strip()
+    after = None
+    if request.args.get('after_id', type=int):
+        after = (request.args.get('after_name', ''), request.args.get('after_id', type=int))
+    users, next_after = users_page(app.config['USERS_PER_PAGE'], query=query, after=after)
+    return render_template('admin/users.html', users=users, form=form, query=query, next_after=next_after)
+
+@app.route('/admin/users/search')
+@read_only
+@login_required
+@role_required('admin')
+def search_users_json():
+    prefix = request.args.get('q', '').strip()
+    if not prefix:
+        return jsonify([])
+    limit = min(request.args.get('limit', app.config['USER_SEARCH_LIMIT'], type=int), app.config['USER_SEARCH_LIMIT'])
+    users = search_users(
+        prefix,
+        limit,
+        role=request.args.get('role'),
+        exclude_course_id=request.args.get('exclude_course', type=int)
+    )
+    return jsonify([
+        {'id': u.id, 'name': u.name, 'username': u.username, 'email': u.email}
+        for u in users
+    ])
+
+@app.route('/admin/import', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def import_csv():
+    form = ImportForm()
+    result = None
+    if form.validate_on_submit():
+        # O upload é lido em streaming, bloco a bloco
+        stream = io.TextIOWrapper(form.csv_file.data.stream, encoding='utf-8-sig')
+        try:
+            if form.kind.data == 'users':
+                result = import_users(stream, workers=app.config['IMPORT_WORKERS'])
+            else:
+                result = import_enrollments(stream, changed_by=current_user.id)
+        except (ValueError, UnicodeDecodeError) as error:
+            db.session.rollback()
+            flash(f'Arquivo inválido: {error}', 'danger')
+        else:
+            flash(f'{result.created} registro(s) importado(s).', 'success')
+    return render_template('admin/import.html', form=form, result=result)
+
+@app.route('/admin/metrics')
+def metrics():
+    # Coletores (Prometheus) usam "Authorization: Bearer <METRICS_TOKEN>"; no navegador, só admins
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    authorized = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    if not authorized and not (current_user.is_authenticated and current_user.role == 'admin'):
+        abort(403)
+    return get_metrics().render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 @app.route('/admin/courses', methods=['GET', 'POST'])
 @login_required
 @role_required('admin')
 def manage_courses():
     form = CourseForm()
-    teachers = User.query.filter_by(role='teacher').all()
-    form.teacher_id.choices = [(t.id, t.username) for t in teachers]
-
     if form.validate_on_submit():
+        if not User.query.filter_by(id=form.teacher_id.data, role='teacher').first():
+            flash('Select a teacher from the search results.', 'danger')
+            return redirect(url_for('manage_courses'))
         course = Course(
             name=form.name.data,
             teacher_id=form.teacher_id.data
         )
         db.session.add(course)
+        db.session.flush()
+        # Linha de resumo desde a criação: o curso aparece no painel antes da primeira matrícula
+        refresh_stats_for_course(course, commit=False)
         db.session.commit()
         flash('Course created successfully', 'success')
         return redirect(url_for('manage_courses'))
 
-    courses = Course.query.all()
+    courses = courses_with_student_counts()
     return render_template('admin/classes.html', courses=courses, form=form)
 
 @app.route('/admin/courses/<int:course_id>/enroll', methods=['GET', 'POST'])
@@ -103,31 +198,42 @@ def enroll_student(course_id):
     course = Course.query.get_or_404(course_id)
     form = EnrollmentForm()
 
-    # Obter lista de alunos que ainda não estão matriculados no curso
-    enrolled_student_ids = [e.student_id for e in Enrollment.query.filter_by(course_id=course_id).all()]
-    available_students = User.query.filter_by(role='student').filter(User.id.notin_(enrolled_student_ids)).all()
-
-    form.student_id.choices = [(s.id, s.username) for s in available_students]
-
+    # Alunos disponíveis são buscados sob demanda (typeahead), sem listar todos na página
     if form.validate_on_submit():
+        student = User.query.filter_by(id=form.student_id.data, role='student').first()
+        already_enrolled = Enrollment.query.filter_by(student_id=form.student_id.data, course_id=course_id).first()
+        if not student or already_enrolled:
+            flash('Select an available student from the search results.', 'danger')
+            return redirect(url_for('enroll_student', course_id=course_id))
         enrollment = Enrollment(
             student_id=form.student_id.data,
             course_id=course_id,
             attendance=100.0  # Iniciar com 100% de frequência
         )
         db.session.add(enrollment)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # Matrícula concorrente do mesmo aluno (índice único em aluno + curso)
+            db.session.rollback()
+            flash('Select an available student from the search results.', 'danger')
+            return redirect(url_for('enroll_student', course_id=course_id))
+        record_enrollments(Enrollment.id == enrollment.id, current_user.id)
+        refresh_stats_for_course(course, commit=False)
         db.session.commit()
+        invalidate_reports(course_id=course_id, student_id=enrollment.student_id)
         flash('Student enrolled successfully', 'success')
         return redirect(url_for('manage_course_enrollments', course_id=course_id))
 
     return render_template('admin/enroll_student.html', course=course, form=form)
 
 @app.route('/admin/courses/<int:course_id>/enrollments')
+@read_only
 @login_required
 @role_required('admin')
 def manage_course_enrollments(course_id):
     course = Course.query.get_or_404(course_id)
-    enrollments = Enrollment.query.filter_by(course_id=course_id).all()
+    enrollments = course_enrollments(course_id)
     return render_template('admin/course_enrollments.html', course=course, enrollments=enrollments)
 
 @app.route('/admin/courses/<int:course_id>/enrollments/<int:enrollment_id>/remove', methods=['POST'])
@@ -139,12 +245,16 @@ def remove_enrollment(course_id, enrollment_id):
         flash('Invalid enrollment', 'danger')
         return redirect(url_for('manage_courses'))
 
+    record_grade_changes([enrollment_change(enrollment, removed=True)], current_user.id, action='remove')
     db.session.delete(enrollment)
+    db.session.flush()
+    refresh_stats_for_course(enrollment.course, commit=False)
     db.session.commit()
+    invalidate_reports(course_id=course_id, student_id=enrollment.student_id)
     flash('Student removed from course', 'success')
     return redirect(url_for('manage_course_enrollments', course_id=course_id))
 
-@app.route('/teacher/grades/<int:course_id>', methods=['GET', 'POST'])
+@app.route('/teacher/grades/<int:course_id>')
 @login_required
 @role_required('teacher')
 def manage_grades(course_id):
@@ -153,80 +263,155 @@ def manage_grades(course_id):
         flash('You do not have permission to manage this course.', 'danger')
         return redirect(url_for('dashboard'))
 
-    form = GradeForm()
-    if form.validate_on_submit():
-        student_id = request.form.get('student_id')
-        app.logger.debug(f"Updating grades - Student ID: {student_id}, Course ID: {course_id}")
-        app.logger.debug(f"Form data - Grade: {form.grade.data}, Attendance: {form.attendance.data}")
-
-        enrollment = Enrollment.query.filter_by(
-            student_id=student_id,
-            course_id=course_id
-        ).first()
-
-        if enrollment:
-            app.logger.debug(f"Found enrollment: {enrollment.id}")
-            old_grade = enrollment.grade
-            enrollment.grade = form.grade.data
-            enrollment.attendance = form.attendance.data
-            db.session.commit()
-            flash('Grades updated successfully', 'success')
-
-            # Criar notificação para o aluno
-            create_notification(
-                student_id,
-                f'Nota atualizada em {course.name}',
-                f'Sua nota foi atualizada para {form.grade.data}',
-                'info'
-            )
-        else:
-            app.logger.error(f"Enrollment not found for student {student_id} in course {course_id}")
-            flash('Error: Student enrollment not found', 'danger')
+    # As notas são gravadas pela planilha (bulk_update_grades)
+    enrollments = course_enrollments(course_id)
+    app.logger.debug("Found %s enrollments for course %s", len(enrollments), course_id)
+    return render_template('teacher/grades.html', course=course, enrollments=enrollments, form=BulkGradeForm())
 
-    enrollments = Enrollment.query.filter_by(course_id=course_id).all()
-    app.logger.debug(f"Found {len(enrollments)} enrollments for course {course_id}")
-    return render_template('teacher/grades.html', course=course, enrollments=enrollments, form=form)
+@app.route('/teacher/grades/<int:course_id>/bulk', methods=['POST'])
+@login_required
+@role_required('teacher')
+def bulk_update_grades(course_id):
+    course = Course.query.get_or_404(course_id)
+    wants_json = request.is_json
+    if course.teacher_id != current_user.id:
+        if wants_json:
+            return jsonify({'error': 'forbidden'}), 403
+        flash('You do not have permission to manage this course.', 'danger')
+        return redirect(url_for('dashboard'))
+
+    # JSON: {"csrf_token": "...", "rows": [{"enrollment_id": 1, "grade": 8.5, "attendance": 95}, ...]}
+    if wants_json:
+        # Antes do formulário: o Flask-WTF lê o token CSRF do corpo e exige um objeto JSON
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'errors': {'body': 'must be a JSON object'}}), 400
+    form = BulkGradeForm()
+    if not form.validate_on_submit():
+        abort(400)
+    if wants_json:
+        rows = payload.get('rows') or []
+    else:
+        rows = rows_from_form(request.form)
+
+    try:
+        diff = apply_grade_rows(course, rows, changed_by=current_user.id)
+    except GradebookError as error:
+        db.session.rollback()
+        if wants_json:
+            return jsonify({'errors': error.errors}), 400
+        flash(f'No grades saved: {len(error.errors)} invalid row(s).', 'danger')
+        enrollments = course_enrollments(course_id)
+        return render_template(
+            'teacher/grades.html', course=course, enrollments=enrollments, form=form,
+            errors=error.errors, submitted=request.form
+        ), 400
+
+    if diff:
+        invalidate_reports(course_id=course_id)
+        for item in diff:
+            invalidate_reports(student_id=item['student_id'])
+
+    if wants_json:
+        return jsonify({'updated': diff, 'unchanged': len(rows) - len(diff)})
+    flash(f'{len(diff)} student(s) updated.', 'success')
+    return redirect(url_for('manage_grades', course_id=course_id))
+
+@app.route('/teacher/grades/<int:course_id>/as-of')
+@read_only
+@login_required
+def grades_as_of(course_id):
+    # Boletim do curso como estava em uma data (?as_of=ISO 8601; padrão: agora)
+    course = Course.query.get_or_404(course_id)
+    if not (current_user.role == 'admin' or course.teacher_id == current_user.id):
+        return jsonify({'error': 'forbidden'}), 403
+    as_of = datetime.utcnow()
+    if request.args.get('as_of'):
+        as_of = parse_window_bound(request.args['as_of'])
+        if as_of is None:
+            return jsonify({'error': 'invalid as_of'}), 400
+    return jsonify({
+        'course_id': course.id,
+        'as_of': as_of.isoformat(),
+        'rows': gradebook_as_of(course.id, as_of),
+    })
 
 @app.route('/student/grades')
+@read_only
 @login_required
 @role_required('student')
 def view_grades():
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
+    enrollments = student_enrollments(current_user.id)
     return render_template('student/view_grades.html', enrollments=enrollments)
 
 @app.route('/calendar')
+@read_only
 @login_required
 def view_calendar():
-    return render_template('calendar/view.html')
+    token = User.query.with_entities(User.calendar_token).filter_by(id=current_user.id).scalar()
+    feed_url = url_for('calendar_feed', token=token, _external=True) if token else None
+    return render_template('calendar/view.html', feed_url=feed_url, feed_form=CalendarFeedForm())
+
+@app.route('/calendar/feed', methods=['POST'])
+@login_required
+def reset_calendar_feed():
+    if CalendarFeedForm().validate_on_submit():
+        rotate_calendar_token(current_user.id)
+        flash('Novo link de assinatura gerado. O link anterior deixou de funcionar.', 'success')
+    return redirect(url_for('view_calendar'))
+
+@app.route('/calendar/feed/<token>.ics')
+@read_only
+def calendar_feed(token):
+    # Sem login: aplicativos de calendário só enviam a URL com o token
+    user = feed_user(token)
+    if user is None:
+        abort(404)
+    etag, versions = feed_etag(user)
+    response = app.response_class(
+        stream_with_context(ics_stream(versions, request.host)), mimetype='text/calendar'
+    )
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/calendar/feed/<token>/changes')
+@read_only
+def calendar_feed_changes(token):
+    user = feed_user(token)
+    if user is None:
+        abort(404)
+    return calendar_changes_response(user)
+
+@app.route('/calendar/events/changes')
+@read_only
+@login_required
+def get_event_changes():
+    return calendar_changes_response(current_user)
+
+def calendar_changes_response(user):
+    try:
+        changes = event_changes(user, request.args.get('since'), limit=app.config['CALENDAR_SYNC_LIMIT'])
+    except ValueError:
+        return jsonify({'error': 'invalid version'}), 400
+    return jsonify(changes)
 
 @app.route('/calendar/events')
+@read_only
 @login_required
 def get_events():
-    events = Event.query.all()
-    event_list = []
-    for event in events:
-        # Verificar permissões baseadas no papel do usuário
-        if current_user.role == 'student':
-            # Estudantes só veem eventos dos seus cursos
-            enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
-            course_ids = [e.course_id for e in enrollments]
-            if event.course_id and event.course_id not in course_ids:
-                continue
-        elif current_user.role == 'teacher':
-            # Professores veem eventos dos seus cursos
-            if event.course_id and event.course_id not in [c.id for c in Course.query.filter_by(teacher_id=current_user.id).all()]:
-                continue
-
-        event_list.append({
-            'id': event.id,
-            'title': event.title,
-            'start': event.start_date.isoformat(),
-            'end': event.end_date.isoformat(),
-            'description': event.description,
-            'type': event.type,
-            'className': f'event-type-{event.type}'
-        })
-    return jsonify(event_list)
+    start = parse_window_bound(request.args.get('start'))
+    end = parse_window_bound(request.args.get('end'))
+    payload = cached_events_payload(current_user, start, end)
+
+    # ETag forte + Last-Modified permitem respostas 304 nas recargas do FullCalendar
+    response = app.response_class(payload['body'], mimetype='application/json')
+    response.set_etag(payload['etag'])
+    response.last_modified = payload['last_modified']
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/calendar/events/add', methods=['GET', 'POST'])
 @login_required
@@ -244,7 +429,7 @@ def add_event():
     form.course_id.choices = [(c.id, c.name) for c in courses]
     form.course_id.choices.insert(0, (0, 'Evento Geral'))
 
-    if form.validate_on_submit():
+    if form.validate_on_submit() and validate_event_dates(form):
         event = Event(
             title=form.title.data,
             description=form.description.data,
@@ -254,8 +439,22 @@ def add_event():
             course_id=form.course_id.data if form.course_id.data != 0 else None,
             created_by=current_user.id
         )
+        # Aulas semanais etc. viram uma única linha com a regra de recorrência
+        set_recurrence(event, build_rule(form.recurrence.data, form.recurrence_until.data,
+                                         form.recurrence_count.data))
         db.session.add(event)
         db.session.commit()
+        invalidate_event_scopes(event.course_id)
+
+        # Avisar os alunos do curso em segundo plano
+        if event.course_id:
+            dispatch(
+                notify_course,
+                event.course_id,
+                f'Novo evento: {event.title}',
+                f'{event.title} em {event.start_date.strftime("%d/%m/%Y %H:%M")}',
+                'info'
+            )
         flash('Evento adicionado com sucesso!', 'success')
         return redirect(url_for('view_calendar'))
 
@@ -279,35 +478,185 @@ def edit_event(event_id):
         courses = Course.query.all()
     form.course_id.choices = [(c.id, c.name) for c in courses]
     form.course_id.choices.insert(0, (0, 'Evento Geral'))
-
-    if form.validate_on_submit():
+    current_recurrence = rule_form_fields(event.recurrence_rule)
+    if request.method == 'GET':
+        form.recurrence.data, form.recurrence_until.data, form.recurrence_count.data = current_recurrence
+
+    if form.validate_on_submit() and validate_event_dates(form):
+        old_course_id = event.course_id
+        # Regras sem equivalente no formulário (BYDAY, INTERVAL...) ficam como estão se não forem alteradas
+        rule = event.recurrence_rule
+        form_recurrence = (form.recurrence.data, form.recurrence_until.data, form.recurrence_count.data)
+        if form_recurrence != current_recurrence:
+            rule = build_rule(*form_recurrence)
+        if event.recurrence_rule and form.start_date.data != event.start_date:
+            # As exceções apontam para os horários antigos das ocorrências
+            event.overrides.clear()
         event.title = form.title.data
         event.description = form.description.data
         event.start_date = form.start_date.data
         event.end_date = form.end_date.data
         event.type = form.type.data
         event.course_id = form.course_id.data if form.course_id.data != 0 else None
+        set_recurrence(event, rule)
         db.session.commit()
+        invalidate_event_scopes(old_course_id, event.course_id)
         flash('Evento atualizado com sucesso!', 'success')
         return redirect(url_for('view_calendar'))
 
     return render_template('calendar/edit_event.html', form=form, event=event)
 
+def validate_event_dates(form):
+    # Erros aparecem junto do campo, como os dos validadores do formulário
+    if form.end_date.data < form.start_date.data:
+        form.end_date.errors.append('A data de término deve ser posterior ao início.')
+        return False
+    until = getattr(form, 'recurrence_until', None)
+    if until is None:
+        return True
+    count = form.recurrence_count
+    if until.data and count.data:
+        count.errors.append('Informe a data final ou o número de ocorrências, não os dois.')
+        return False
+    if until.data and until.data < form.start_date.data.date():
+        until.errors.append('A repetição deve terminar depois do início do evento.')
+        return False
+    # Séries finitas cabem no limite de expansão; sem data final nem contagem, a série é aberta
+    limit = app.config['RECURRENCE_MAX_OCCURRENCES']
+    if count.data and count.data > limit:
+        count.errors.append(f'A repetição pode ter no máximo {limit} ocorrências.')
+        return False
+    if until.data and form.recurrence.data and \
+            exceeds_max_occurrences(build_rule(form.recurrence.data, until.data), form.start_date.data):
+        until.errors.append(f'A repetição passa de {limit} ocorrências; escolha uma data final anterior.')
+        return False
+    return True
+
+@app.route('/calendar/events/<int:event_id>/occurrences/<occurrence>', methods=['GET', 'POST'])
+@login_required
+def edit_occurrence(event_id, occurrence):
+    event = Event.query.get_or_404(event_id)
+
+    if current_user.role == 'student' or \
+       (current_user.role == 'teacher' and event.created_by != current_user.id):
+        flash('Você não tem permissão para editar este evento.', 'danger')
+        return redirect(url_for('view_calendar'))
+
+    # A ocorrência é identificada pelo seu início original (originalStart no JSON do calendário)
+    original_start = parse_window_bound(occurrence)
+    if original_start is None or not is_occurrence(event, original_start):
+        abort(404)
+
+    override = EventOverride.query.filter_by(event_id=event.id, original_start=original_start).first()
+    duration = event.end_date - event.start_date
+    form = OccurrenceForm()
+    if request.method == 'GET':
+        form.title.data = override.title if override and override.title else event.title
+        form.description.data = override.description if override and override.description is not None else event.description
+        form.start_date.data = override.start_date if override and override.start_date else original_start
+        form.end_date.data = override.end_date if override and override.end_date else form.start_date.data + duration
+
+    if form.validate_on_submit() and (form.cancel_occurrence.data or form.restore.data or validate_event_dates(form)):
+        if form.restore.data:
+            if override is not None:
+                db.session.delete(override)
+            message = 'Ocorrência restaurada.'
+        else:
+            if override is None:
+                override = EventOverride(event_id=event.id, original_start=original_start)
+                db.session.add(override)
+            if form.cancel_occurrence.data:
+                override.cancelled = True
+                message = 'Ocorrência cancelada.'
+            else:
+                # Só guarda o que difere da série; o resto continua herdado
+                override.cancelled = False
+                override.title = form.title.data if form.title.data != event.title else None
+                override.description = form.description.data if form.description.data != event.description else None
+                override.start_date = form.start_date.data if form.start_date.data != original_start else None
+                override.end_date = form.end_date.data if form.end_date.data != form.start_date.data + duration else None
+                message = 'Ocorrência atualizada.'
+        # A série inteira é a unidade da sincronização incremental e do feed ICS
+        event.updated_at = datetime.utcnow()
+        db.session.commit()
+        invalidate_event_scopes(event.course_id)
+        flash(message, 'success')
+        return redirect(url_for('view_calendar'))
+
+    return render_template('calendar/edit_occurrence.html', form=form, event=event,
+                           original_start=original_start, override=override)
+
 
 @app.route('/notifications')
 @login_required
 def view_notifications():
-    notifications = Notification.query.filter_by(
-        user_id=current_user.id
-    ).order_by(Notification.created_at.desc()).all()
-
-    # Marcar todas as notificações como lidas
+    per_page = app.config['NOTIFICATIONS_PER_PAGE']
+    query = Notification.query.filter_by(user_id=current_user.id)
+
+    # Paginação por keyset em (created_at, id): custo constante em qualquer página
+    cursor = parse_notification_cursor(request.args.get('before'))
+    if cursor:
+        query = query.filter(tuple_(Notification.created_at, Notification.id) < cursor)
+    notifications = query.order_by(
+        Notification.created_at.desc(), Notification.id.desc()
+    ).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(notifications) > per_page:
+        notifications = notifications[:per_page]
+        last = notifications[-1]
+        next_cursor = f'{last.created_at.isoformat()}_{last.id}'
+
+    # Desanexar para que o commit não expire (e recarregue) os objetos exibidos
     for notification in notifications:
-        if not notification.read:
-            notification.read = True
+        db.session.expunge(notification)
+
+    # Marcar todas as notificações como lidas com um único UPDATE
+    marked = Notification.query.filter_by(user_id=current_user.id, read=False).update(
+        {'read': True}, synchronize_session=False
+    )
+    if marked:
+        adjust_unread_count(current_user.id, -marked)
     db.session.commit()
 
-    return render_template('notifications.html', notifications=notifications)
+    return render_template('notifications.html', notifications=notifications, next_cursor=next_cursor)
+
+@app.route('/notifications/unread')
+@read_only
+@login_required
+def unread_notifications():
+    # Fallback sem stream (NOTIFICATION_STREAM_URL vazio): o navegador consulta o contador em cache
+    response = jsonify({'count': unread_notifications_count(current_user.id)})
+    response.cache_control.no_store = True
+    return response
+
+@app.route('/notifications/stream')
+@login_required
+def notification_stream():
+    # Server-Sent Events: novas notificações e o contador de não lidas, sem recarregar a página.
+    # Conexões longas: em produção esta rota é servida por workers gevent (gunicorn_sse.conf.py)
+    user_id = current_user.id
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = latest_notification_id(user_id)
+    events = notification_events(
+        user_id, last_id,
+        heartbeat=app.config['SSE_HEARTBEAT'],
+        max_duration=app.config['SSE_MAX_DURATION']
+    )
+    response = app.response_class(stream_with_context(events), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def parse_notification_cursor(value):
+    if not value:
+        return None
+    created_at, _, notification_id = value.rpartition('_')
+    try:
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except ValueError:
+        return None
 
 @app.route('/notifications/mark_read/<int:notification_id>')
 @login_required
@@ -317,32 +666,78 @@ def mark_notification_read(notification_id):
         flash('Você não tem permissão para acessar esta notificação.', 'danger')
         return redirect(url_for('view_notifications'))
 
-    notification.read = True
+    # UPDATE condicional: só decrementa o contador se a notificação ainda não foi lida
+    marked = Notification.query.filter_by(id=notification.id, read=False).update(
+        {'read': True}, synchronize_session=False
+    )
+    if marked:
+        adjust_unread_count(current_user.id, -marked)
     db.session.commit()
     return redirect(url_for('view_notifications'))
 
-def create_notification(user_id, title, message, type='info'):
-    notification = Notification(
-        user_id=user_id,
-        title=title,
-        message=message,
-        type=type
+def serve_report(kind, subject_id, report, download_name):
+    # Sem cache de relatórios, o PDF é gerado em memória e não passa pelo disco
+    if not app.config['REPORT_CACHE_ENABLED']:
+        job = get_report_jobs().submit(
+            kind,
+            report,
+            owner_id=current_user.id,
+            dedupe_key=(kind, PDFGenerator.report_key(kind, report)),
+            download_name=download_name,
+            retry_url=request.path
+        )
+        return redirect(url_for('report_job_status', job_id=job.id))
+
+    cache = get_report_cache()
+    filename = cache.filename(kind, subject_id, report)
+
+    # Dados inalterados: o PDF já gerado é servido direto do cache
+    if cache.lookup(filename):
+        try:
+            return send_from_directory(
+                app.config['REPORTS_DIR'], filename, as_attachment=True, download_name=download_name
+            )
+        except NotFound:
+            # Removido por outro worker (evict) entre a consulta e o envio: gera de novo
+            pass
+
+    cache.evict()
+    job = get_report_jobs().submit(
+        kind,
+        report,
+        owner_id=current_user.id,
+        dedupe_key=filename,
+        download_name=download_name,
+        filename=filename,
+        retry_url=request.path
     )
-    db.session.add(notification)
-    db.session.commit()
+    return redirect(url_for('report_job_status', job_id=job.id))
 
-# Ensure reports directory exists
-os.makedirs('static/reports', exist_ok=True)
+def invalidate_reports(course_id=None, student_id=None):
+    if not app.config['REPORT_CACHE_ENABLED']:
+        return
+    cache = get_report_cache()
+    if course_id is not None:
+        cache.invalidate('course', course_id)
+    if student_id is not None:
+        cache.invalidate('student', student_id)
 
 @app.route('/student/report/pdf')
+@read_only
 @login_required
 @role_required('student')
 def generate_student_pdf():
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
-    filename = PDFGenerator.generate_student_report(current_user, enrollments)
-    return send_from_directory('static/reports', filename, as_attachment=True)
+    student = db.session.get(User, current_user.id)
+    enrollments = student_enrollments(current_user.id)
+    return serve_report(
+        'student',
+        current_user.id,
+        PDFGenerator.student_report_data(student, enrollments),
+        f'student_report_{current_user.username}.pdf'
+    )
 
 @app.route('/teacher/course/<int:course_id>/report/pdf')
+@read_only
 @login_required
 @role_required('teacher')
 def generate_course_pdf(course_id):
@@ -351,6 +746,128 @@ def generate_course_pdf(course_id):
         flash('Você não tem permissão para gerar relatórios deste curso.', 'danger')
         return redirect(url_for('dashboard'))
 
-    enrollments = Enrollment.query.filter_by(course_id=course_id).all()
-    filename = PDFGenerator.generate_course_report(course, enrollments)
-    return send_from_directory('static/reports', filename, as_attachment=True)
\ No newline at end of file
+    enrollments = course_enrollments(course_id)
+    return serve_report(
+        'course',
+        course_id,
+        PDFGenerator.course_report_data(course, enrollments, stats=current_course_stats(course)),
+        f'course_report_{course.name}.pdf'
+    )
+
+@app.route('/admin/reports/export', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def export_reports():
+    form = ReportExportForm()
+    form.course_id.choices = [(0, 'Todo o programa')] + [
+        (c.id, c.name) for c in Course.query.order_by(Course.name).all()
+    ]
+    if request.method == 'GET':
+        form.course_id.data = request.args.get('course_id', 0, type=int)
+
+    if form.validate_on_submit():
+        course_id = form.course_id.data or None
+
+        # Uma única consulta com os alunos, cursos e professores já carregados
+        enrollments = program_enrollments(course_id)
+
+        reports = []
+        for _, student_enrollments in groupby(enrollments, key=lambda e: e.student_id):
+            student_enrollments = list(student_enrollments)
+            student = student_enrollments[0].student
+            reports.append((
+                secure_filename(f'{student.username}.pdf') or f'student_{student.id}.pdf',
+                PDFGenerator.student_report_data(student, student_enrollments)
+            ))
+        if not reports:
+            flash('Nenhum aluno matriculado para exportar.', 'warning')
+            return redirect(url_for('export_reports', course_id=course_id or 0))
+
+        scope = f'course_{course_id}' if course_id else 'programa'
+        job = get_report_jobs().submit_batch(
+            reports,
+            owner_id=current_user.id,
+            dedupe_key=('batch', current_user.id, course_id, form.format.data),
+            download_name=f'relatorios_{scope}.{form.format.data}',
+            merge=form.format.data == 'pdf',
+            retry_url=url_for('export_reports', course_id=course_id or 0)
+        )
+        return redirect(url_for('report_job_status', job_id=job.id))
+
+    return render_template('admin/export_reports.html', form=form)
+
+@app.route('/exports/gradebook.<fmt>')
+@read_only
+@login_required
+def export_gradebook(fmt):
+    if fmt not in ('csv', 'xlsx') or current_user.role not in ('admin', 'teacher'):
+        abort(404)
+
+    course_id = request.args.get('course_id', type=int)
+    teacher_id = request.args.get('teacher_id', type=int)
+    role = request.args.get('role')
+    if role and role not in ROLES:
+        abort(400)
+    # Professores exportam apenas os próprios cursos
+    if current_user.role == 'teacher':
+        teacher_id = current_user.id
+
+    query = gradebook_export_query(course_id=course_id, teacher_id=teacher_id, role=role)
+
+    def rows():
+        # Cursor do lado do servidor: memória constante, qualquer que seja o tamanho do programa
+        result = db.session.execute(query.execution_options(yield_per=app.config['EXPORT_BATCH_SIZE']))
+        for row in result:
+            yield tuple(row)
+
+    if fmt == 'csv':
+        body = csv_stream(GRADEBOOK_HEADER, rows())
+        mimetype = 'text/csv'
+    else:
+        body = xlsx_stream(GRADEBOOK_HEADER, rows(), sheet_name='Notas')
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    response = app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=notas.{fmt}'
+    return response
+
+def get_owned_report_job(job_id):
+    job = get_report_jobs().get(job_id)
+    if job is None or job.owner_id != current_user.id:
+        abort(404)
+    return job
+
+@app.route('/reports/jobs/<job_id>')
+@login_required
+def report_job_status(job_id):
+    job = get_owned_report_job(job_id)
+    if request.args.get('format') == 'json' or request.accept_mimetypes.best == 'application/json':
+        status = job.to_dict()
+        if job.status == 'done':
+            status['download_url'] = url_for('download_report', job_id=job.id)
+        return jsonify(status)
+    return render_template('reports/job_status.html', job=job)
+
+@app.route('/reports/jobs/<job_id>/download')
+@login_required
+def download_report(job_id):
+    job = get_owned_report_job(job_id)
+    if job.status != 'done':
+        return redirect(url_for('report_job_status', job_id=job.id))
+    if job.filename is None:
+        # Relatório avulso sem cache: bytes guardados pelo gerenciador de jobs
+        data = get_report_jobs().output(job)
+        if data is not None:
+            return send_file(BytesIO(data), mimetype='application/pdf', as_attachment=True,
+                             download_name=job.download_name)
+    else:
+        # Enviado em streaming a partir do disco (REPORTS_DIR é compartilhado entre os workers)
+        try:
+            return send_from_directory(
+                app.config['REPORTS_DIR'], job.filename, as_attachment=True, download_name=job.download_name
+            )
+        except NotFound:
+            pass
+    # O PDF expirou ou saiu do cache de relatórios (evict/invalidate) depois do job: gera de novo
+    flash('O arquivo do relatório expirou e precisa ser gerado novamente.', 'info')
+    return redirect(job.retry_url or url_for('dashboard'))
@@ -18,3 +18,102 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }, 5000);
 });
+
+// Typeahead: busca usuários no servidor e preenche o campo oculto com o id escolhido
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-typeahead-url]').forEach(function(input) {
+        var target = document.getElementById(input.dataset.typeaheadTarget);
+        var list = document.createElement('div');
+        list.className = 'list-group position-absolute w-100';
+        list.style.zIndex = 1000;
+        input.parentNode.style.position = 'relative';
+        input.parentNode.appendChild(list);
+        var timer = null;
+
+        input.addEventListener('input', function() {
+            target.value = '';
+            clearTimeout(timer);
+            var query = input.value.trim();
+            if (!query) {
+                list.innerHTML = '';
+                return;
+            }
+            timer = setTimeout(function() {
+                var url = input.dataset.typeaheadUrl + (input.dataset.typeaheadUrl.indexOf('?') >= 0 ? '&' : '?') + 'q=' + encodeURIComponent(query);
+                fetch(url)
+                    .then(function(response) { return response.json(); })
+                    .then(function(users) {
+                        list.innerHTML = '';
+                        users.forEach(function(user) {
+                            var item = document.createElement('button');
+                            item.type = 'button';
+                            item.className = 'list-group-item list-group-item-action';
+                            item.textContent = user.name + ' (' + user.username + ')';
+                            item.addEventListener('click', function() {
+                                input.value = item.textContent;
+                                target.value = user.id;
+                                list.innerHTML = '';
+                            });
+                            list.appendChild(item);
+                        });
+                    });
+            }, 200);
+        });
+    });
+});
+
+// Notificações em tempo real (SSE): atualiza o contador e mostra um aviso para cada nova notificação.
+// Sem stream configurado (NOTIFICATION_STREAM_URL), só o contador é consultado periodicamente.
+document.addEventListener('DOMContentLoaded', function() {
+    var badge = document.getElementById('unread-badge');
+
+    function updateBadge(count) {
+        if (badge) {
+            badge.textContent = count;
+            badge.classList.toggle('d-none', count === 0);
+        }
+    }
+
+    var url = document.body.dataset.notificationStream;
+    if (!url || !window.EventSource) {
+        var pollUrl = document.body.dataset.notificationPoll;
+        var seconds = parseInt(document.body.dataset.notificationPollSeconds, 10);
+        if (pollUrl && seconds > 0) {
+            setInterval(function() {
+                if (document.hidden) {
+                    return;
+                }
+                fetch(pollUrl, {credentials: 'same-origin'})
+                    .then(function(response) { return response.ok ? response.json() : null; })
+                    .then(function(data) {
+                        if (data) {
+                            updateBadge(data.count);
+                        }
+                    })
+                    .catch(function() {});
+            }, seconds * 1000);
+        }
+        return;
+    }
+    var source = new EventSource(url, {withCredentials: true});
+
+    source.addEventListener('unread', function(event) {
+        updateBadge(JSON.parse(event.data).count);
+    });
+
+    source.addEventListener('notification', function(event) {
+        var notification = JSON.parse(event.data);
+        var container = document.querySelector('.container.mt-4');
+        if (!container) {
+            return;
+        }
+        var alert = document.createElement('div');
+        alert.className = 'alert alert-' + (notification.type || 'info');
+        var title = document.createElement('strong');
+        title.textContent = notification.title;
+        alert.appendChild(title);
+        alert.appendChild(document.createTextNode(' ' + notification.message));
+        container.insertBefore(alert, container.firstChild);
+        setTimeout(function() { alert.remove(); }, 5000);
+    });
+});
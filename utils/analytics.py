@@ -0,0 +1,96 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import Integer, case, cast, func, select
+from app import db
+from models import Course, Enrollment, CourseStats, TeacherStats
+
+
+def _compute(where):
+    threshold = current_app.config['ATTENDANCE_THRESHOLD']
+    width = current_app.config['GRADE_BUCKET_WIDTH']
+    base = select().select_from(Enrollment).join(Course, Enrollment.course_id == Course.id).where(where)
+
+    # Agregados calculados no banco, em uma única passada
+    totals = db.session.execute(base.add_columns(
+        func.count(Enrollment.id),
+        func.count(Enrollment.grade),
+        func.avg(Enrollment.grade),
+        func.avg(Enrollment.attendance),
+        func.coalesce(func.sum(case((Enrollment.attendance < threshold, 1), else_=0)), 0),
+        func.count(func.distinct(Course.id)),
+    )).one()
+    student_count, graded_count, mean_grade, mean_attendance, at_risk_count, course_count = totals
+
+    # Mediana: lê apenas o(s) valor(es) central(is) da lista ordenada
+    median_grade = None
+    if graded_count:
+        middle = db.session.scalars(
+            base.add_columns(Enrollment.grade)
+            .where(Enrollment.grade.is_not(None))
+            .order_by(Enrollment.grade)
+            .offset((graded_count - 1) // 2)
+            .limit(2 - graded_count % 2)
+        ).all()
+        median_grade = sum(middle) / len(middle)
+
+    # floor explícito: o cast para inteiro arredonda no PostgreSQL e trunca no SQLite
+    bucket = cast(func.floor(Enrollment.grade / width), Integer)
+    distribution = {
+        str(index * width): count
+        for index, count in db.session.execute(
+            base.add_columns(bucket, func.count(Enrollment.id))
+            .where(Enrollment.grade.is_not(None))
+            .group_by(bucket)
+            .order_by(bucket)
+        ).all()
+    }
+
+    return {
+        'course_count': course_count,
+        'student_count': student_count,
+        'graded_count': graded_count,
+        'mean_grade': float(mean_grade) if mean_grade is not None else None,
+        'median_grade': median_grade,
+        'mean_attendance': float(mean_attendance) if mean_attendance is not None else None,
+        'at_risk_count': int(at_risk_count),
+        'grade_distribution': distribution,
+        'updated_at': datetime.utcnow(),
+    }
+
+
+def refresh_course_stats(course_id, commit=True):
+    stats = _compute(Enrollment.course_id == course_id)
+    stats.pop('course_count')
+    db.session.merge(CourseStats(course_id=course_id, **stats))
+    if commit:
+        db.session.commit()
+
+
+def current_course_stats(course):
+    # Resumo do curso; sem a linha pré-calculada (curso ainda não atualizado), calculado na hora
+    if course.stats is not None:
+        return course.stats
+    stats = _compute(Enrollment.course_id == course.id)
+    stats.pop('course_count')
+    return CourseStats(course_id=course.id, **stats)
+
+
+def refresh_teacher_stats(teacher_id, commit=True):
+    db.session.merge(TeacherStats(teacher_id=teacher_id, **_compute(Course.teacher_id == teacher_id)))
+    if commit:
+        db.session.commit()
+
+
+def refresh_stats_for_course(course, commit=True):
+    # Atualização incremental: só o curso alterado e o seu professor
+    refresh_course_stats(course.id, commit=False)
+    if course.teacher_id:
+        refresh_teacher_stats(course.teacher_id, commit=False)
+    if commit:
+        db.session.commit()
+
+
+def refresh_all_stats():
+    for course in Course.query.all():
+        refresh_stats_for_course(course, commit=False)
+    db.session.commit()
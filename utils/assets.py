@@ -0,0 +1,123 @@
+# Assets estáticos com o hash do conteúdo no nome (css/style.a1b2c3d4e5f6.css), comprimidos
+# com antecedência (.gz e, com o pacote brotli, .br) e servidos com Cache-Control imutável:
+# o navegador não revalida e o nome muda quando o conteúdo muda.
+#
+# Em produção o proxy reverso serve ASSETS_DIR direto do disco, sem passar pelo Python:
+#
+#   location /assets/ {
+#       alias /app/static/dist/;
+#       gzip_static on;
+#       brotli_static on;
+#       add_header Cache-Control "public, max-age=31536000, immutable";
+#   }
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    # Opcional: sem o pacote, só as versões .gz são geradas
+    brotli = None
+
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.map')
+# (Accept-Encoding, sufixo do arquivo pré-comprimido), em ordem de preferência
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def _write_atomic(path, data):
+    # Workers podem gerar os mesmos arquivos ao mesmo tempo: arquivo temporário + rename
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_assets(source_dir, output_dir):
+    # Copia os arquivos de source_dir para output_dir com o hash no nome e grava o manifesto
+    # {nome lógico: nome com hash}. Versões anteriores ficam no disco para as páginas já abertas.
+    output_dir = os.path.abspath(output_dir)
+    manifest = {}
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != output_dir)
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            logical = os.path.relpath(path, source_dir).replace(os.sep, '/')
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            stem, ext = os.path.splitext(logical)
+            hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+            manifest[logical] = hashed
+
+            target = os.path.join(output_dir, hashed)
+            if os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if ext in COMPRESSIBLE:
+                # mtime=0: o .gz é idêntico em todo build do mesmo conteúdo
+                _write_atomic(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write_atomic(target + '.br', brotli.compress(data, quality=11))
+            # Por último: a existência do original indica que as versões comprimidas estão prontas
+            _write_atomic(target, data)
+
+    os.makedirs(output_dir, exist_ok=True)
+    _write_atomic(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(filename):
+    # Helper de template: URL do arquivo com hash; sem manifesto (ou em debug), o arquivo de static/
+    manifest = current_app.extensions['assets_manifest']
+    hashed = manifest.get(filename)
+    if hashed is None or current_app.debug:
+        return url_for('static', filename=filename)
+    if current_app.config['ASSETS_URL']:
+        return f"{current_app.config['ASSETS_URL'].rstrip('/')}/{hashed}"
+    return url_for('assets', filename=hashed)
+
+
+def serve_asset(filename):
+    # Fallback sem proxy: entrega a versão pré-comprimida aceita pelo navegador
+    directory = current_app.config['ASSETS_DIR']
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in ENCODINGS:
+        path = safe_join(directory, filename + suffix)
+        if request.accept_encodings[encoding] and path and os.path.isfile(path):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_assets(app):
+    if app.config['ASSETS_AUTOBUILD']:
+        manifest = build_assets(app.static_folder, app.config['ASSETS_DIR'])
+    else:
+        manifest = load_manifest(app.config['ASSETS_DIR'])
+        if not manifest:
+            app.logger.warning('Manifesto de assets ausente em %s; rode `flask build-assets`',
+                               app.config['ASSETS_DIR'])
+    app.extensions['assets_manifest'] = manifest
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+    app.add_template_global(asset_url)
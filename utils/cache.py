@@ -0,0 +1,130 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class LRUCache:
+    # Cache em memória do processo, com limite de itens e expiração (TTL)
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class FileSystemCache:
+    # Substituto local de um cache compartilhado (ex.: Redis) entre os workers do gunicorn
+    prune_every = 256
+
+    def __init__(self, directory, ttl=300):
+        self.directory = directory
+        self.ttl = ttl
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.cache')
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), 'rb') as fh:
+                expires_at, value = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return default
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        # Escrita atômica: arquivo temporário + rename
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as fh:
+            pickle.dump((expires_at, value), fh, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                self._remove(os.path.join(self.directory, name))
+
+    def prune(self):
+        # Remove entradas expiradas
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'rb') as fh:
+                    expires_at, _ = pickle.load(fh)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue
+            if expires_at is not None and expires_at < now:
+                self._remove(path)
+
+    def _remove(self, path):
+        # Outro worker pode ter removido o arquivo primeiro (prune/clear concorrentes)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def create_cache(app, namespace, ttl=None, maxsize=None):
+    backend = app.config.get('CACHE_BACKEND', 'filesystem')
+    ttl = app.config.get('CACHE_DEFAULT_TTL', 300) if ttl is None else ttl
+    if backend == 'filesystem':
+        return FileSystemCache(os.path.join(app.config['CACHE_DIR'], namespace), ttl=ttl)
+    if backend == 'memory':
+        return LRUCache(maxsize=maxsize or app.config.get('CACHE_MAXSIZE', 1024), ttl=ttl)
+    raise ValueError(f'Unknown cache backend: {backend}')
+
+
+def get_cache(namespace, **options):
+    # Um cache por namespace, criado sob demanda para a aplicação corrente
+    caches = current_app.extensions.setdefault('siga_caches', {})
+    if namespace not in caches:
+        caches[namespace] = create_cache(current_app, namespace, **options)
+    return caches[namespace]
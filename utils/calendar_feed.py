@@ -0,0 +1,429 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import and_, event as sa_event, inspect, or_, select, tuple_, update
+from sqlalchemy.orm import Session, selectinload
+from app import db
+from models import Course, Enrollment, Event, EventOverride, EventTombstone, SyncCounter, User
+from utils.cache import get_cache
+from utils.db_routing import primary_reads
+from utils.recurrence import expand_events
+
+
+def parse_window_bound(value):
+    # FullCalendar envia datas ISO 8601, às vezes com fuso horário
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def visible_events_query(user, start=None, end=None):
+    query = Event.query
+
+    # Visibilidade por papel resolvida no próprio SQL (subconsulta), sem laço em Python
+    if user.role == 'student':
+        course_ids = select(Enrollment.course_id).where(Enrollment.student_id == user.id)
+        query = query.filter(or_(Event.course_id.is_(None), Event.course_id.in_(course_ids)))
+    elif user.role == 'teacher':
+        course_ids = select(Course.id).where(Course.teacher_id == user.id)
+        query = query.filter(or_(Event.course_id.is_(None), Event.course_id.in_(course_ids)))
+
+    return _window_filter(query, start, end).order_by(Event.start_date, Event.id)
+
+
+def _window_filter(query, start=None, end=None):
+    # Somente eventos que intersectam a janela visível do calendário; séries recorrentes
+    # entram enquanto a última ocorrência (recurrence_end) não terminou
+    if start is not None:
+        query = query.filter(or_(
+            Event.end_date >= start,
+            and_(Event.recurrence_rule.isnot(None),
+                 or_(Event.recurrence_end.is_(None), Event.recurrence_end >= start))
+        ))
+    if end is not None:
+        query = query.filter(Event.start_date < end)
+    return query
+
+
+def serialize_event(event):
+    data = {
+        'id': event.id,
+        'title': event.title,
+        'start': event.start_date.isoformat(),
+        'end': event.end_date.isoformat(),
+        'description': event.description,
+        'type': event.type,
+        'className': f'event-type-{event.type}'
+    }
+    # Ocorrências de séries (utils/recurrence.Occurrence) levam o início original,
+    # que identifica a ocorrência ao cancelar ou alterar
+    original_start = getattr(event, 'original_start', None)
+    if original_start is not None:
+        data['recurring'] = True
+        data['originalStart'] = original_start.isoformat()
+    return data
+
+
+def visibility_scopes(user):
+    # Escopos de visibilidade: eventos gerais, eventos por curso ou tudo (admin)
+    if user.role == 'student':
+        course_ids = db.session.scalars(
+            select(Enrollment.course_id).where(Enrollment.student_id == user.id)
+        ).all()
+    elif user.role == 'teacher':
+        course_ids = db.session.scalars(
+            select(Course.id).where(Course.teacher_id == user.id)
+        ).all()
+    else:
+        return ['all']
+    return ['general'] + [f'course:{course_id}' for course_id in sorted(set(course_ids))]
+
+
+def _calendar_cache():
+    return get_cache('calendar', ttl=current_app.config.get('CALENDAR_CACHE_TTL', 300))
+
+
+def _scope_version(cache, scope):
+    version = cache.get(f'version:{scope}')
+    if version is None:
+        version = (uuid.uuid4().hex, datetime.now(timezone.utc).replace(microsecond=0))
+        cache.set(f'version:{scope}', version, ttl=0)
+    return version
+
+
+def cached_events_payload(user, start=None, end=None):
+    cache = _calendar_cache()
+    versions = [(scope, _scope_version(cache, scope)) for scope in visibility_scopes(user)]
+
+    # A chave muda sempre que algum escopo da visão é invalidado
+    key_source = repr((start, end, [(scope, token) for scope, (token, _) in versions]))
+    key = 'view:' + hashlib.sha1(key_source.encode()).hexdigest()
+
+    payload = cache.get(key)
+    if payload is None:
+        # Cache preenchido a partir do primário (ver primary_reads)
+        with primary_reads(db.session()):
+            events = expand_events(visible_events_query(user, start, end).all(), start, end)
+        body = current_app.json.dumps([serialize_event(event) for event in events]).encode()
+        payload = {
+            'body': body,
+            'etag': hashlib.sha256(body).hexdigest(),
+            'last_modified': max(modified for _, (_, modified) in versions),
+        }
+        cache.set(key, payload)
+    return payload
+
+
+def invalidate_event_scopes(*course_ids):
+    cache = _calendar_cache()
+    scopes = {'all'}
+    for course_id in course_ids:
+        scopes.add(f'course:{course_id}' if course_id else 'general')
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    for scope in scopes:
+        cache.set(f'version:{scope}', (uuid.uuid4().hex, now), ttl=0)
+
+
+# --- Assinatura ICS e sincronização incremental ---
+
+def feed_user(token):
+    # Usuário dono do token da assinatura (sem sessão: o token é a credencial)
+    if not token:
+        return None
+    return User.query.filter_by(calendar_token=token).first()
+
+
+def rotate_calendar_token(user_id):
+    # Novo token invalida o link anterior
+    token = secrets.token_urlsafe(32)
+    db.session.execute(update(User).where(User.id == user_id).values(calendar_token=token))
+    db.session.commit()
+    return token
+
+
+def scope_events_query(scope, since=None):
+    # Mesma visibilidade de visible_events_query, decomposta por escopo para o cache
+    query = Event.query
+    if scope == 'general':
+        query = query.filter(Event.course_id.is_(None))
+    elif scope.startswith('course:'):
+        query = query.filter(Event.course_id == int(scope.split(':', 1)[1]))
+    return _window_filter(query, since).order_by(Event.start_date, Event.id)
+
+
+def _ics_escape(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n').replace('\r', '')
+
+
+def _ics_line(line):
+    # RFC 5545: linhas de no máximo 75 octetos, continuadas com um espaço
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Não cortar no meio de um caractere UTF-8
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ics_time(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _ics_vevent(event, host, start_date, end_date, title, description, extra=()):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.id}@{host}',
+        f'DTSTAMP:{_ics_time(event.updated_at)}Z',
+        f'LAST-MODIFIED:{_ics_time(event.updated_at)}Z',
+        *extra,
+        f'DTSTART:{_ics_time(start_date)}',
+        f'DTEND:{_ics_time(end_date)}',
+        f'SUMMARY:{_ics_escape(title)}',
+    ]
+    if description:
+        lines.append(f'DESCRIPTION:{_ics_escape(description)}')
+    if event.type:
+        lines.append(f'CATEGORIES:{_ics_escape(event.type)}')
+    lines.append('END:VEVENT')
+    return ''.join(_ics_line(line) for line in lines)
+
+
+def ics_event(event, host):
+    if not event.recurrence_rule:
+        return _ics_vevent(event, host, event.start_date, event.end_date, event.title, event.description)
+
+    # Série recorrente: a expansão fica com o aplicativo de calendário. Ocorrências
+    # canceladas viram EXDATE; as alteradas, VEVENTs com RECURRENCE-ID e o mesmo UID.
+    overrides = sorted(event.overrides, key=lambda override: override.original_start)
+    extra = [f'RRULE:{event.recurrence_rule}']
+    extra += [f'EXDATE:{_ics_time(override.original_start)}' for override in overrides if override.cancelled]
+    parts = [_ics_vevent(event, host, event.start_date, event.end_date, event.title, event.description, extra)]
+    duration = event.end_date - event.start_date
+    for override in overrides:
+        if override.cancelled:
+            continue
+        start_date = override.start_date or override.original_start
+        parts.append(_ics_vevent(
+            event, host, start_date, override.end_date or start_date + duration,
+            override.title or event.title,
+            override.description if override.description is not None else event.description,
+            [f'RECURRENCE-ID:{_ics_time(override.original_start)}']
+        ))
+    return ''.join(parts)
+
+
+def _feed_window_start():
+    # Janela por dia: a chave do cache muda uma vez por dia, não a cada requisição
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=current_app.config['CALENDAR_FEED_PAST_DAYS'])
+
+
+def feed_etag(user):
+    cache = _calendar_cache()
+    versions = [(scope, _scope_version(cache, scope)[0]) for scope in visibility_scopes(user)]
+    source = repr((_feed_window_start(), versions))
+    return hashlib.sha256(source.encode()).hexdigest(), versions
+
+
+def ics_stream(versions, host, batch_size=500):
+    # Gerado em streaming; os VEVENTs de cada escopo ficam em cache e são
+    # compartilhados por todos os usuários que enxergam o mesmo escopo
+    cache = _calendar_cache()
+    since = _feed_window_start()
+    yield ''.join(_ics_line(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//SIGA//Calendario Academico//PT',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:SIGA',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT1H',
+        'X-PUBLISHED-TTL:PT1H',
+    ))
+    for scope, token in versions:
+        key = 'ics:' + hashlib.sha1(repr((scope, token, since, host)).encode()).hexdigest()
+        chunk = cache.get(key)
+        if chunk is not None:
+            yield chunk
+            continue
+        parts = []
+        query = scope_events_query(scope, since).options(selectinload(Event.overrides))
+        with primary_reads(db.session()):
+            for event in query.yield_per(batch_size):
+                part = ics_event(event, host)
+                parts.append(part)
+                yield part
+        cache.set(key, ''.join(parts))
+    yield _ics_line('END:VCALENDAR')
+
+
+# Versão de sincronização: "<sync_version>_<event id>_<escopo>". O escopo é um hash dos
+# escopos de visibilidade do usuário; se mudou (matrícula removida, curso trocado de professor),
+# o cliente recebe reset=True e uma sincronização completa, pois não há como listar o que saiu.
+
+def sync_scope(user):
+    return hashlib.sha1(repr(visibility_scopes(user)).encode()).hexdigest()[:12]
+
+
+def format_sync_version(sync_version, event_id, scope):
+    return f'{sync_version}_{event_id}_{scope}'
+
+
+def parse_sync_version(value):
+    # Levanta ValueError para versões malformadas
+    sync_version, event_id, scope = value.split('_')
+    return int(sync_version), int(event_id), scope
+
+
+def serialize_change(event):
+    # Séries vão inteiras (regra + exceções); alterar uma ocorrência muda a versão da série
+    data = dict(serialize_event(event), updated_at=event.updated_at.isoformat())
+    if event.recurrence_rule:
+        data['rrule'] = event.recurrence_rule
+        data['overrides'] = [{
+            'originalStart': override.original_start.isoformat(),
+            'cancelled': override.cancelled,
+            'title': override.title,
+            'description': override.description,
+            'start': override.start_date.isoformat() if override.start_date else None,
+            'end': override.end_date.isoformat() if override.end_date else None,
+        } for override in sorted(event.overrides, key=lambda override: override.original_start)]
+    return data
+
+
+def _committed_sync_version():
+    # Versões até este valor já foram confirmadas: o contador só avança com a linha travada
+    return db.session.scalar(select(SyncCounter.value).where(SyncCounter.name == SYNC_COUNTER)) or 0
+
+
+def _removed_events(user, delivered_version, until_version):
+    # Eventos que saíram de um escopo visível ao usuário e não estão mais visíveis
+    query = select(EventTombstone.event_id).where(
+        EventTombstone.sync_version > delivered_version, EventTombstone.sync_version <= until_version
+    )
+    scopes = visibility_scopes(user)
+    if scopes != ['all']:
+        course_ids = [int(scope.split(':', 1)[1]) for scope in scopes if scope.startswith('course:')]
+        query = query.where(or_(EventTombstone.course_id.is_(None), EventTombstone.course_id.in_(course_ids)))
+    removed = set(db.session.scalars(query))
+    if removed:
+        removed -= {event_id for event_id, in visible_events_query(user).order_by(None)
+                    .filter(Event.id.in_(removed)).with_entities(Event.id)}
+    return sorted(removed)
+
+
+def event_changes(user, version=None, limit=500):
+    # Eventos visíveis alterados depois da versão informada, em ordem de (sync_version, id),
+    # e os ids dos que deixaram de ser visíveis (`removed`).
+    # O cliente guarda `version` e repete a chamada enquanto `has_more` for verdadeiro.
+    scope = sync_scope(user)
+    since = None
+    reset = False
+    if version:
+        since_version, since_id, since_scope = parse_sync_version(version)
+        if since_scope == scope:
+            since = (since_version, since_id)
+        else:
+            reset = True
+
+    # Limite superior lido antes dos eventos: transações ainda abertas têm versão maior
+    committed = _committed_sync_version()
+    query = visible_events_query(user).order_by(None).filter(Event.sync_version <= committed)
+    if since is not None:
+        query = query.filter(tuple_(Event.sync_version, Event.id) > since)
+    events = query.options(selectinload(Event.overrides)).order_by(
+        Event.sync_version, Event.id
+    ).limit(limit + 1).all()
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    if has_more:
+        cursor = (events[-1].sync_version, events[-1].id)
+    else:
+        # Tudo até `committed` foi entregue: a próxima chamada começa na versão seguinte
+        cursor = (committed + 1, 0)
+    removed = []
+    if since is not None:
+        # Cursor (v, 0): a versão v ainda não foi entregue; (v, id): entregue até o fim da página
+        delivered = since[0] - 1 if since[1] == 0 else since[0]
+        removed = _removed_events(user, delivered, cursor[0] if has_more else committed)
+    return {
+        'events': [serialize_change(event) for event in events],
+        'removed': removed,
+        'reset': reset,
+        'version': format_sync_version(*cursor, scope),
+        'has_more': has_more,
+    }
+
+
+# --- Versões de sincronização ---
+
+SYNC_COUNTER = 'event'
+
+
+def _next_sync_version(session):
+    # Uma versão por transação. O UPDATE trava a linha do contador até o commit: outra transação
+    # que altere eventos espera e recebe a versão seguinte, então versão menor = commit anterior.
+    version = session.info.get('sync_version')
+    if version is None:
+        counter = SyncCounter.__table__
+        updated = session.execute(
+            update(counter).where(counter.c.name == SYNC_COUNTER).values(value=counter.c.value + 1)
+        )
+        if not updated.rowcount:
+            # Banco criado com db.create_all(), sem a linha inserida pela migração
+            session.execute(counter.insert().values(name=SYNC_COUNTER, value=1))
+        version = session.scalar(select(counter.c.value).where(counter.c.name == SYNC_COUNTER))
+        session.info['sync_version'] = version
+    return version
+
+
+@sa_event.listens_for(Session, 'before_flush')
+def _version_event_changes(session, flush_context, instances):
+    changed = set()
+    removed = []
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Event):
+                if obj in session.deleted:
+                    removed.append((obj.id, obj.course_id))
+                    continue
+                if obj in session.dirty and not session.is_modified(obj):
+                    continue
+                changed.add(obj)
+                old_course = inspect(obj).attrs.course_id.history.deleted
+                if old_course and old_course[0] != obj.course_id:
+                    removed.append((obj.id, old_course[0]))
+            elif isinstance(obj, EventOverride):
+                # Exceções de ocorrência fazem parte da série
+                parent = obj.event if obj.event is not None else session.get(Event, obj.event_id)
+                if parent is not None and parent not in session.deleted:
+                    changed.add(parent)
+    if not changed and not removed:
+        return
+    version = _next_sync_version(session)
+    for changed_event in changed:
+        changed_event.sync_version = version
+    for event_id, course_id in removed:
+        session.add(EventTombstone(event_id=event_id, course_id=course_id, sync_version=version))
+
+
+@sa_event.listens_for(Session, 'after_commit')
+@sa_event.listens_for(Session, 'after_rollback')
+def _reset_sync_version(session):
+    session.info.pop('sync_version', None)
@@ -0,0 +1,167 @@
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from sqlalchemy import insert, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+from app import db
+from models import User, Course, Enrollment
+from utils.analytics import refresh_stats_for_course
+from utils.grade_history import record_enrollments
+
+USER_COLUMNS = ('name', 'username', 'email', 'password', 'role')
+ENROLLMENT_COLUMNS = ('username', 'course_id')
+ROLES = ('student', 'teacher', 'admin')
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.duplicates = []  # (linha, motivo)
+        self.errors = []  # (linha, motivo)
+
+
+def _chunks(reader, size):
+    # Lê o CSV em blocos, sem carregar o arquivo inteiro; a linha 1 é o cabeçalho
+    numbered = enumerate(reader, start=2)
+    while True:
+        chunk = list(islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _reader(stream, columns):
+    reader = csv.DictReader(stream)
+    missing = [c for c in columns if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f'Missing CSV column(s): {", ".join(missing)}')
+    return reader
+
+
+def _insert_rows(model, rows, result, describe):
+    # INSERT em lote; se outra transação criou um registro concorrente, refaz linha a linha
+    if not rows:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model), [row for _, row in rows])
+        result.created += len(rows)
+    except IntegrityError:
+        for line, row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(model), [row])
+                result.created += 1
+            except IntegrityError:
+                result.duplicates.append((line, describe(row)))
+
+
+def import_users(stream, chunk_size=500, workers=None):
+    result = ImportResult()
+    reader = _reader(stream, USER_COLUMNS)
+
+    # Hash de senha é lento por definição: calculado em paralelo, fora da thread principal
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in _chunks(reader, chunk_size):
+            valid = []
+            seen_usernames, seen_emails = set(), set()
+            for line, raw in chunk:
+                row = {c: (raw.get(c) or '').strip() for c in USER_COLUMNS}
+                row['role'] = row['role'].lower() or 'student'
+                if not all(row[c] for c in ('name', 'username', 'email', 'password')):
+                    result.errors.append((line, 'missing required field'))
+                elif row['role'] not in ROLES:
+                    result.errors.append((line, f'invalid role {row["role"]!r}'))
+                elif '@' not in row['email']:
+                    result.errors.append((line, 'invalid email'))
+                elif row['username'] in seen_usernames or row['email'] in seen_emails:
+                    result.duplicates.append((line, 'duplicated in file'))
+                else:
+                    seen_usernames.add(row['username'])
+                    seen_emails.add(row['email'])
+                    valid.append((line, row))
+
+            # Duplicados já cadastrados: uma consulta por bloco
+            existing = db.session.execute(
+                select(User.username, User.email).where(or_(
+                    User.username.in_(seen_usernames), User.email.in_(seen_emails)
+                ))
+            ).all()
+            taken_usernames = {username for username, _ in existing}
+            taken_emails = {email for _, email in existing}
+            new_rows = []
+            for line, row in valid:
+                if row['username'] in taken_usernames:
+                    result.duplicates.append((line, f'username {row["username"]!r} already exists'))
+                elif row['email'] in taken_emails:
+                    result.duplicates.append((line, f'email {row["email"]!r} already exists'))
+                else:
+                    new_rows.append((line, row))
+
+            hashes = pool.map(generate_password_hash, [row.pop('password') for _, row in new_rows])
+            for (_, row), password_hash in zip(new_rows, hashes):
+                row['password_hash'] = password_hash
+
+            _insert_rows(User, new_rows, result, lambda row: f'username {row["username"]!r} or email already exists')
+            db.session.commit()
+    return result
+
+
+def import_enrollments(stream, chunk_size=1000, changed_by=None):
+    result = ImportResult()
+    reader = _reader(stream, ENROLLMENT_COLUMNS)
+    touched_courses = set()
+
+    for chunk in _chunks(reader, chunk_size):
+        parsed = []
+        for line, raw in chunk:
+            username = (raw.get('username') or '').strip()
+            course_id = (raw.get('course_id') or '').strip()
+            if not username or not course_id.isdigit():
+                result.errors.append((line, 'missing username or invalid course_id'))
+            else:
+                parsed.append((line, username, int(course_id)))
+
+        # Resolve alunos, cursos e matrículas existentes do bloco com três consultas
+        students = dict(db.session.execute(
+            select(User.username, User.id).where(
+                User.username.in_({username for _, username, _ in parsed}), User.role == 'student'
+            )
+        ).all())
+        courses = set(db.session.scalars(
+            select(Course.id).where(Course.id.in_({course_id for _, _, course_id in parsed}))
+        ).all())
+        pairs = {(students[u], c) for _, u, c in parsed if u in students}
+        enrolled = set(db.session.execute(
+            select(Enrollment.student_id, Enrollment.course_id)
+            .where(tuple_(Enrollment.student_id, Enrollment.course_id).in_(pairs))
+        ).all()) if pairs else set()
+
+        new_rows = []
+        for line, username, course_id in parsed:
+            if username not in students:
+                result.errors.append((line, f'student {username!r} not found'))
+            elif course_id not in courses:
+                result.errors.append((line, f'course {course_id} not found'))
+            elif (students[username], course_id) in enrolled:
+                result.duplicates.append((line, f'{username!r} already enrolled in course {course_id}'))
+            else:
+                enrolled.add((students[username], course_id))
+                new_rows.append((line, {
+                    'student_id': students[username], 'course_id': course_id, 'attendance': 100.0
+                }))
+
+        _insert_rows(Enrollment, new_rows, result, lambda row: 'already enrolled')
+        duplicated = {line for line, _ in result.duplicates}
+        inserted = {(row['student_id'], row['course_id']) for line, row in new_rows if line not in duplicated}
+        if inserted:
+            record_enrollments(tuple_(Enrollment.student_id, Enrollment.course_id).in_(inserted), changed_by)
+        db.session.commit()
+        touched_courses.update(row['course_id'] for _, row in new_rows)
+
+    # Indicadores atualizados uma vez por curso afetado, ao final da importação
+    for course in Course.query.filter(Course.id.in_(touched_courses)).all():
+        refresh_stats_for_course(course, commit=False)
+    db.session.commit()
+    return result
@@ -0,0 +1,84 @@
+import random
+import time
+from contextlib import contextmanager
+from flask import current_app, has_request_context, request, session as flask_session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Chave na sessão do Flask: até quando (epoch) as leituras do usuário ficam no primário
+STICKY_KEY = '_db_primary_until'
+
+
+class RoutingSession(FlaskSession):
+    # As consultas das rotas marcadas com @read_only vão para a réplica escolhida em
+    # before_request (session.info['replica']); flushes e DML sempre vão para o primário
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        replica = self.info.get('replica')
+        if replica and bind is None and engine is self._db.engine and not self._flushing \
+                and not getattr(clause, 'is_dml', False):
+            return self._db.engines[replica]
+        return engine
+
+
+def read_only(view):
+    # Marca a rota (já com login_required etc.) como somente leitura: pode consultar uma réplica
+    view.read_only = True
+    return view
+
+
+def init_db_routing(app, db):
+    @app.before_request
+    def _choose_replica():
+        replicas = app.config['DATABASE_REPLICAS']
+        view = app.view_functions.get(request.endpoint)
+        if not replicas or not getattr(view, 'read_only', False):
+            return
+        primary_until = flask_session.get(STICKY_KEY)
+        if primary_until is not None:
+            if primary_until > time.time():
+                # Read-your-writes: o usuário acabou de gravar e a réplica pode estar atrasada
+                return
+            flask_session.pop(STICKY_KEY)
+        db.session().info['replica'] = random.choice(replicas)
+
+
+@contextmanager
+def primary_reads(session):
+    # Leituras que alimentam caches compartilhados vão ao primário: um dado atrasado da
+    # réplica ficaria no cache (sob a versão nova) até expirar
+    replica = session.info.pop('replica', None)
+    try:
+        yield
+    finally:
+        if replica is not None:
+            session.info['replica'] = replica
+
+
+def _mark_write(session):
+    session.info['wrote'] = True
+    # O restante da requisição lê do primário, onde a escrita já é visível
+    session.info.pop('replica', None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_flush(session, flush_context):
+    _mark_write(session)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write(orm_execute_state.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _stick_to_primary(session):
+    if session.info.pop('wrote', False) and has_request_context() and current_app.config['DATABASE_REPLICAS']:
+        flask_session[STICKY_KEY] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_write(session):
+    session.info.pop('wrote', None)
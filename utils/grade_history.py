@@ -0,0 +1,79 @@
+from datetime import datetime
+from sqlalchemy import func, insert, literal, select
+from app import db
+from models import User, Enrollment, GradeHistory
+
+
+def record_grade_changes(changes, changed_by, action='update'):
+    # Sem commit: o histórico entra na mesma transação da alteração das notas.
+    # changes: dicts com enrollment_id, course_id, student_id, old_grade, grade, old_attendance, attendance
+    if not changes:
+        return
+    changed_at = datetime.utcnow()
+    db.session.execute(
+        insert(GradeHistory),
+        [dict(change, action=action, changed_by=changed_by, changed_at=changed_at) for change in changes]
+    )
+
+
+def enrollment_change(enrollment, grade=None, attendance=None, removed=False):
+    # Linha de histórico a partir de uma matrícula (valores atuais -> novos)
+    return {
+        'enrollment_id': enrollment.id,
+        'course_id': enrollment.course_id,
+        'student_id': enrollment.student_id,
+        'old_grade': enrollment.grade,
+        'grade': None if removed else grade,
+        'old_attendance': enrollment.attendance,
+        'attendance': None if removed else attendance,
+    }
+
+
+def record_enrollments(condition, changed_by=None):
+    # Registro inicial das matrículas criadas em lote (INSERT ... SELECT, sem carregar objetos)
+    db.session.execute(
+        insert(GradeHistory).from_select(
+            ['enrollment_id', 'course_id', 'student_id', 'action', 'grade', 'attendance',
+             'changed_by', 'changed_at'],
+            select(Enrollment.id, Enrollment.course_id, Enrollment.student_id, literal('enroll'),
+                   Enrollment.grade, Enrollment.attendance, literal(changed_by), literal(datetime.utcnow()))
+            .where(condition)
+        )
+    )
+
+
+def gradebook_as_of(course_id, as_of):
+    # Última linha de histórico de cada matrícula até `as_of`, em uma única consulta (ROW_NUMBER)
+    ranked = (
+        select(
+            GradeHistory,
+            func.row_number().over(
+                partition_by=GradeHistory.enrollment_id,
+                order_by=(GradeHistory.changed_at.desc(), GradeHistory.id.desc())
+            ).label('position')
+        )
+        .where(GradeHistory.course_id == course_id, GradeHistory.changed_at <= as_of)
+        .subquery()
+    )
+    query = (
+        select(
+            ranked.c.enrollment_id, ranked.c.student_id, User.name, User.username,
+            ranked.c.grade, ranked.c.attendance, ranked.c.changed_at, ranked.c.changed_by
+        )
+        .join(User, User.id == ranked.c.student_id)
+        .where(ranked.c.position == 1, ranked.c.action != 'remove')
+        .order_by(User.name, ranked.c.enrollment_id)
+    )
+    return [
+        {
+            'enrollment_id': row.enrollment_id,
+            'student_id': row.student_id,
+            'student': row.name,
+            'username': row.username,
+            'grade': row.grade,
+            'attendance': row.attendance,
+            'changed_at': row.changed_at.isoformat(),
+            'changed_by': row.changed_by,
+        }
+        for row in db.session.execute(query)
+    ]
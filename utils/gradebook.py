@@ -0,0 +1,131 @@
+from sqlalchemy import update
+from app import db
+from models import Enrollment
+from utils.notifications import notify_many
+from utils.analytics import refresh_stats_for_course
+from utils.grade_history import enrollment_change, record_grade_changes
+
+
+class GradebookError(ValueError):
+    def __init__(self, errors):
+        super().__init__('Invalid gradebook rows')
+        self.errors = errors
+
+
+def _parse_number(value, field, minimum, maximum, required):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f'{field} is required')
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be a number')
+    if number < minimum or (maximum is not None and number > maximum):
+        raise ValueError(f'{field} out of range')
+    return number
+
+
+def _enrollment_id(value):
+    # Somente inteiros (bool é subclasse de int no Python; listas e objetos não são chaves válidas)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    if isinstance(value, str):
+        return int(value) if value.strip().isdigit() else None
+    return value
+
+
+def _check_scalar(value, field):
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float, str))):
+        raise ValueError(f'{field} must be a number')
+
+
+def rows_from_form(form):
+    # Campos da planilha: grade-<enrollment_id> e attendance-<enrollment_id>
+    rows = {}
+    for key, value in form.items():
+        field, _, enrollment_id = key.partition('-')
+        if field in ('grade', 'attendance') and enrollment_id.isdigit():
+            rows.setdefault(int(enrollment_id), {'enrollment_id': int(enrollment_id)})[field] = value
+    return list(rows.values())
+
+
+def apply_grade_rows(course, rows, changed_by=None):
+    # Valida todas as linhas antes de gravar qualquer uma (tudo ou nada)
+    enrollments = {
+        e.id: e for e in Enrollment.query.filter_by(course_id=course.id).all()
+    }
+    errors = {}
+    changes = []
+    if not isinstance(rows, list):
+        raise GradebookError({'rows': 'must be a list'})
+    seen = set()
+    for index, row in enumerate(rows):
+        # Linhas malformadas são identificadas pela posição na lista
+        if not isinstance(row, dict):
+            errors[f'row {index}'] = 'must be an object'
+            continue
+        enrollment_id = _enrollment_id(row.get('enrollment_id'))
+        if enrollment_id is None:
+            errors[f'row {index}'] = 'enrollment_id must be an integer'
+            continue
+        if enrollment_id in seen:
+            errors[str(enrollment_id)] = 'duplicate enrollment_id'
+            continue
+        seen.add(enrollment_id)
+        enrollment = enrollments.get(enrollment_id)
+        if enrollment is None:
+            errors[str(enrollment_id)] = 'enrollment not found in this course'
+            continue
+        try:
+            _check_scalar(row.get('grade'), 'grade')
+            _check_scalar(row.get('attendance'), 'attendance')
+            grade = _parse_number(row.get('grade'), 'grade', 0, None, required=False)
+            attendance = _parse_number(row.get('attendance'), 'attendance', 0, 100, required=True)
+        except ValueError as error:
+            errors[str(enrollment.id)] = str(error)
+            continue
+        if grade != enrollment.grade or attendance != enrollment.attendance:
+            changes.append((enrollment, grade, attendance))
+    if errors:
+        raise GradebookError(errors)
+
+    diff = [
+        {
+            'enrollment_id': enrollment.id,
+            'student_id': enrollment.student_id,
+            'grade': [enrollment.grade, grade],
+            'attendance': [enrollment.attendance, attendance],
+        }
+        for enrollment, grade, attendance in changes
+    ]
+    if not changes:
+        return diff
+
+    # Histórico com os valores anteriores, na mesma transação do UPDATE
+    record_grade_changes(
+        [enrollment_change(enrollment, grade, attendance) for enrollment, grade, attendance in changes],
+        changed_by
+    )
+
+    # UPDATE em lote por chave primária (executemany) em uma única transação
+    db.session.execute(
+        update(Enrollment),
+        [{'id': enrollment.id, 'grade': grade, 'attendance': attendance}
+         for enrollment, grade, attendance in changes]
+    )
+
+    # Notifica apenas os alunos cuja nota mudou
+    notify_many([
+        (
+            item['student_id'],
+            f'Nota atualizada em {course.name}',
+            f'Sua nota foi atualizada para {item["grade"][1]}',
+            'info'
+        )
+        for item in diff
+        if item['grade'][0] != item['grade'][1] and item['grade'][1] is not None
+    ], commit=False)
+    refresh_stats_for_course(course, commit=False)
+    db.session.commit()
+    return diff
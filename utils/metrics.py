@@ -0,0 +1,241 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from flask import before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Métricas agregadas por endpoint, em memória em cada processo. Com METRICS_DIR, cada worker
+# grava o seu snapshot em <METRICS_DIR>/<pid>.json e /admin/metrics junta todos (rótulo pid):
+# o coletor enxerga o servidor inteiro, qualquer que seja o worker que atende a coleta
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Nome da métrica Prometheus -> (campo da amostra, descrição)
+SERIES = (
+    ('siga_request_duration_seconds', 'duration', 'Tempo total de resposta por endpoint'),
+    ('siga_request_sql_seconds', 'sql_time', 'Tempo gasto em consultas SQL por requisição'),
+    ('siga_request_queries', 'queries', 'Número de consultas SQL por requisição'),
+    ('siga_request_template_seconds', 'template_time', 'Tempo de renderização de templates por requisição'),
+)
+
+
+class EndpointMetrics:
+    # Últimas `window` amostras de cada série (percentis) e totais acumulados (_sum/_count)
+    def __init__(self, window):
+        self.samples = {field: deque(maxlen=window) for _, field, _ in SERIES}
+        self.totals = {field: 0.0 for _, field, _ in SERIES}
+        self.statuses = {}
+        self.count = 0
+
+    def add(self, sample, status):
+        self.count += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        for field, value in sample.items():
+            self.samples[field].append(value)
+            self.totals[field] += value
+
+
+def quantile(ordered, q):
+    # Método "nearest rank": sem interpolação, suficiente para painéis
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class MetricsRegistry:
+    def __init__(self, window=1024, directory=None, flush_interval=5):
+        self.window = window
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.endpoints = {}
+        self.lock = threading.Lock()
+        self._flushed_at = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def record(self, endpoint, sample, status=200):
+        with self.lock:
+            metrics = self.endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self.endpoints[endpoint] = EndpointMetrics(self.window)
+            metrics.add(sample, status)
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                endpoint: (
+                    metrics.count,
+                    dict(metrics.totals),
+                    {field: sorted(values) for field, values in metrics.samples.items()},
+                    dict(metrics.statuses),
+                )
+                for endpoint, metrics in self.endpoints.items()
+            }
+
+    def flush(self):
+        # Snapshot deste processo para os demais workers (gravação atômica)
+        self._flushed_at = time.monotonic()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp_path, os.path.join(self.directory, f'{os.getpid()}.json'))
+
+    def _snapshots(self):
+        # {pid: snapshot} de todos os workers vivos; arquivos de processos encerrados são removidos
+        if not self.directory:
+            return {os.getpid(): self.snapshot()}
+        self.flush()
+        snapshots = {}
+        for entry in os.scandir(self.directory):
+            name, ext = os.path.splitext(entry.name)
+            if ext != '.json' or not name.isdigit():
+                continue
+            pid = int(name)
+            if not _alive(pid):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(entry.path) as fh:
+                    snapshots[pid] = json.load(fh)
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render_prometheus(self):
+        snapshots = sorted(self._snapshots().items())
+        lines = []
+        for name, field, description in SERIES:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} summary')
+            for pid, snapshot in snapshots:
+                for endpoint in sorted(snapshot):
+                    count, totals, samples, _ = snapshot[endpoint]
+                    labels = f'endpoint="{_escape(endpoint)}",pid="{pid}"'
+                    for q in QUANTILES:
+                        value = quantile(samples[field], q)
+                        lines.append(f'{name}{{{labels},quantile="{q}"}} {value:.6g}')
+                    lines.append(f'{name}_sum{{{labels}}} {totals[field]:.6g}')
+                    lines.append(f'{name}_count{{{labels}}} {count}')
+        # Respostas por status (inclusive 500 de exceções não tratadas)
+        lines.append('# HELP siga_requests_total Requisições por endpoint e status')
+        lines.append('# TYPE siga_requests_total counter')
+        for pid, snapshot in snapshots:
+            for endpoint in sorted(snapshot):
+                statuses = snapshot[endpoint][3]
+                for status in sorted(statuses, key=int):
+                    lines.append(
+                        f'siga_requests_total{{endpoint="{_escape(endpoint)}",pid="{pid}",status="{status}"}} '
+                        f'{statuses[status]}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(label):
+    return label.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def init_metrics(app):
+    registry = MetricsRegistry(
+        window=app.config['METRICS_WINDOW'],
+        directory=app.config['METRICS_DIR'] or None,
+        flush_interval=app.config['METRICS_FLUSH_SECONDS']
+    )
+    app.extensions['metrics'] = registry
+    slow_query = app.config['SLOW_QUERY_MS'] / 1000.0
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics = {'queries': 0, 'sql_time': 0.0, 'template_time': 0.0, 'template_started': []}
+        g.metrics_started = time.perf_counter()
+
+    def finish_request_metrics(status):
+        metrics = g.pop('metrics', None)
+        if metrics is not None:
+            duration = time.perf_counter() - g.pop('metrics_started')
+            registry.record(_endpoint(), {
+                'duration': duration,
+                'sql_time': metrics['sql_time'],
+                'queries': metrics['queries'],
+                'template_time': metrics['template_time'],
+            }, status)
+
+    @app.after_request
+    def record_request_metrics(response):
+        # Respostas em streaming: conta até o início do envio do corpo
+        finish_request_metrics(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request_metrics(exception):
+        # Exceção propagada (PROPAGATE_EXCEPTIONS) ou falha em um after_request:
+        # after_request não registrou a requisição, que conta como 500
+        finish_request_metrics(500)
+
+    @before_render_template.connect_via(app)
+    def start_template_timer(sender, template, context, **extra):
+        if has_request_context() and 'metrics' in g:
+            g.metrics['template_started'].append(time.perf_counter())
+
+    @template_rendered.connect_via(app)
+    def stop_template_timer(sender, template, context, **extra):
+        if has_request_context() and 'metrics' in g and g.metrics['template_started']:
+            started = g.metrics['template_started'].pop()
+            g.metrics['template_time'] += time.perf_counter() - started
+
+    # Ouvintes na classe Engine: valem para qualquer engine/bind do processo.
+    # Consultas fora de uma requisição (CLI, threads de fundo) não são contadas.
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        elapsed = time.perf_counter() - started
+        if not has_request_context() or 'metrics' not in g:
+            return
+        g.metrics['queries'] += 1
+        g.metrics['sql_time'] += elapsed
+        if slow_query and elapsed >= slow_query:
+            app.logger.warning('Consulta lenta (%.1f ms) em %s %s: %s',
+                               elapsed * 1000, request.method, _endpoint(), statement)
+
+    @event.listens_for(Engine, 'handle_error')
+    def discard_query_timer(exception_context):
+        # Consulta com erro: after_cursor_execute não é chamado
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('query_started'):
+            connection.info['query_started'].pop()
+
+    return registry
+
+
+def get_metrics():
+    return current_app.extensions['metrics']
@@ -0,0 +1,210 @@
+import json
+import os
+import queue
+import select as select_module
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+from app import db
+from models import User, Notification
+
+# Canal do LISTEN/NOTIFY; o payload leva apenas ids de usuários (limite de 8000 bytes do PostgreSQL)
+CHANNEL = 'siga_notifications'
+IDS_PER_MESSAGE = 1000
+
+
+class Subscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=1)
+
+    def signal(self):
+        # Um aviso pendente basta: o stream sempre relê tudo o que há de novo
+        try:
+            self.queue.put_nowait(True)
+        except queue.Full:
+            pass
+
+    def wait(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    # Pub/sub em memória: serve quando quem grava e quem mantém o stream estão no mesmo processo
+    def __init__(self, app):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def deliver(self, user_ids):
+        with self._lock:
+            targets = [s for user_id in user_ids for s in self._subscriptions.get(user_id, ())]
+        for subscription in targets:
+            subscription.signal()
+
+    def publish(self, user_ids):
+        self.deliver(user_ids)
+
+
+class PostgresBroker(LocalBroker):
+    # LISTEN/NOTIFY: avisos gravados por qualquer processo (workers síncronos, CLI, fila
+    # de notificações) chegam aos processos assíncronos que mantêm os streams abertos
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self._listener = None
+        self._pid = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        return super().subscribe(user_id)
+
+    def publish(self, user_ids):
+        user_ids = sorted(user_ids)
+        with db.engine.begin() as connection:
+            for start in range(0, len(user_ids), IDS_PER_MESSAGE):
+                connection.execute(
+                    text('SELECT pg_notify(:channel, :payload)'),
+                    {'channel': CHANNEL, 'payload': json.dumps(user_ids[start:start + IDS_PER_MESSAGE])}
+                )
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener is None or self._pid != os.getpid() or not self._listener.is_alive():
+                self._pid = os.getpid()
+                self._listener = threading.Thread(target=self._listen, name='notification-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    connection = db.engine.raw_connection()
+                try:
+                    dbapi = connection.driver_connection
+                    dbapi.autocommit = True
+                    dbapi.cursor().execute(f'LISTEN {CHANNEL}')
+                    while True:
+                        # select() é cooperativo sob gevent: a espera não bloqueia o worker
+                        if select_module.select([dbapi], [], [], 30) == ([], [], []):
+                            continue
+                        dbapi.poll()
+                        while dbapi.notifies:
+                            self.deliver(json.loads(dbapi.notifies.pop(0).payload))
+                finally:
+                    connection.invalidate()
+            except Exception:
+                self.app.logger.exception('Conexão LISTEN perdida; reconectando')
+                threading.Event().wait(5)
+
+
+BROKERS = {'local': LocalBroker, 'postgres': PostgresBroker}
+
+
+def get_broker():
+    app = current_app._get_current_object()
+    if 'notification_broker' not in app.extensions:
+        app.extensions['notification_broker'] = BROKERS[app.config['NOTIFICATION_BROKER']](app)
+    return app.extensions['notification_broker']
+
+
+def signal_users(user_ids, session=None):
+    # Como invalidate_user: o aviso só sai após o commit, quando as linhas já são visíveis
+    session = session or db.session()
+    session.info.setdefault('signal_users', set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_signals(session):
+    user_ids = session.info.pop('signal_users', None)
+    if user_ids:
+        # O commit já aconteceu: uma falha no aviso não deve derrubar a requisição
+        try:
+            get_broker().publish(user_ids)
+        except Exception:
+            current_app.logger.exception('Falha ao publicar aviso de notificações')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_signals(session):
+    session.info.pop('signal_users', None)
+
+
+def _sse(event_name, data, event_id=None):
+    lines = [f'event: {event_name}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def latest_notification_id(user_id):
+    return db.session.scalar(
+        select(Notification.id).where(Notification.user_id == user_id)
+        .order_by(Notification.id.desc()).limit(1)
+    ) or 0
+
+
+def notification_events(user_id, last_id, heartbeat=15, max_duration=600, batch_size=50):
+    # Gerador do stream SSE. Entre um aviso e outro não há consulta nem conexão com o banco
+    # aberta: só a espera na fila da inscrição (barata em um worker gevent).
+    subscription = get_broker().subscribe(user_id)
+    deadline = time.monotonic() + max_duration
+    try:
+        # Reconexão rápida quando o servidor encerra o stream (max_duration) ou o worker reinicia
+        yield 'retry: 3000\n\n'
+        signaled = True
+        while time.monotonic() < deadline:
+            if signaled:
+                while True:
+                    notifications = db.session.scalars(
+                        select(Notification)
+                        .where(Notification.user_id == user_id, Notification.id > last_id)
+                        .order_by(Notification.id).limit(batch_size)
+                    ).all()
+                    for notification in notifications:
+                        last_id = notification.id
+                        yield _sse('notification', {
+                            'id': notification.id,
+                            'title': notification.title,
+                            'message': notification.message,
+                            'type': notification.type,
+                            'created_at': notification.created_at.isoformat(),
+                        }, event_id=notification.id)
+                    if len(notifications) < batch_size:
+                        break
+                unread = db.session.scalar(
+                    select(User.unread_notifications_count).where(User.id == user_id)
+                ) or 0
+                # Devolve a conexão ao pool antes de voltar a esperar
+                db.session.close()
+                yield _sse('unread', {'count': unread})
+            else:
+                yield ': keepalive\n\n'
+            signaled = subscription.wait(heartbeat)
+        # Encerra periodicamente; o EventSource reconecta com Last-Event-ID
+    finally:
+        subscription.close()
@@ -0,0 +1,122 @@
+import os
+import queue
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert, literal, select, update
+from app import db
+from models import User, Enrollment, Notification
+from utils.session_cache import invalidate_user
+from utils.notification_stream import signal_users
+
+
+def adjust_unread_count(user_ids, delta):
+    # Incremento atômico no banco, na mesma transação da alteração das notificações
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    # Streams SSE abertos desses usuários são avisados após o commit
+    signal_users(user_ids)
+    db.session.execute(
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(unread_notifications_count=User.unread_notifications_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def notify_many(notifications, commit=True):
+    # notifications: lista de (user_id, título, mensagem, tipo), com textos possivelmente distintos
+    if not notifications:
+        return 0
+
+    # Um único INSERT em lote para todos os destinatários
+    now = datetime.utcnow()
+    db.session.execute(insert(Notification), [
+        {'user_id': user_id, 'title': title, 'message': message,
+         'type': type, 'read': False, 'created_at': now}
+        for user_id, title, message, type in notifications
+    ])
+
+    # Um UPDATE de contador por incremento distinto (normalmente apenas um)
+    per_user = Counter(user_id for user_id, _, _, _ in notifications)
+    by_delta = defaultdict(list)
+    for user_id, delta in per_user.items():
+        by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        adjust_unread_count(sorted(user_ids), delta)
+
+    if commit:
+        db.session.commit()
+    return len(notifications)
+
+
+def notify_course(course_id, title, message, type='info', commit=True):
+    # INSERT ... SELECT ... RETURNING: os contadores são ajustados exatamente para as linhas
+    # inseridas; uma matrícula confirmada entre dois comandos não recebe contador sem notificação
+    recipients = db.session.scalars(
+        insert(Notification).from_select(
+            ['user_id', 'title', 'message', 'type', 'read', 'created_at'],
+            select(
+                Enrollment.student_id, literal(title), literal(message),
+                literal(type), literal(False), literal(datetime.utcnow())
+            ).where(Enrollment.course_id == course_id)
+        ).returning(Notification.user_id)
+    ).all()
+    if recipients:
+        adjust_unread_count(recipients, 1)
+    if commit:
+        db.session.commit()
+    return len(recipients)
+
+
+class NotificationDispatcher:
+    # Fila local processada por uma thread de fundo, fora do ciclo da requisição
+    def __init__(self, app):
+        self.app = app
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, func, *args, **kwargs):
+        self._ensure_worker()
+        self._queue.put((func, args, kwargs))
+
+    def join(self):
+        self._queue.join()
+
+    def _ensure_worker(self):
+        with self._lock:
+            # Após o fork do gunicorn, a thread do processo pai não existe no filho
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            func, args, kwargs = self._queue.get()
+            try:
+                with self.app.app_context():
+                    func(*args, **kwargs)
+            except Exception:
+                self.app.logger.exception('Falha ao enviar notificações (%s)', func.__name__)
+            finally:
+                self._queue.task_done()
+
+
+def get_dispatcher():
+    app = current_app._get_current_object()
+    if 'notification_dispatcher' not in app.extensions:
+        app.extensions['notification_dispatcher'] = NotificationDispatcher(app)
+    return app.extensions['notification_dispatcher']
+
+
+def dispatch(func, *args, **kwargs):
+    # NOTIFICATION_DISPATCH: 'background' (padrão) ou 'inline'
+    if current_app.config.get('NOTIFICATION_DISPATCH') == 'inline':
+        return func(*args, **kwargs)
+    get_dispatcher().submit(func, *args, **kwargs)
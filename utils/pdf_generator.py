@@ -1,35 +1,90 @@
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from datetime import datetime
+from io import BytesIO
+import hashlib
+import json
 
 class PDFGenerator:
+    # Incrementar quando o layout mudar, para não servir PDFs antigos do cache
+    LAYOUT_VERSION = 1
+
+    # Os relatórios são montados a partir de dados simples (dicts/listas), que podem
+    # ser enviados a processos de trabalho; os objetos ORM ficam na requisição.
     @staticmethod
-    def generate_student_report(student, enrollments):
-        filename = f"student_report_{student.username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        doc = SimpleDocTemplate(f"static/reports/{filename}", pagesize=letter)
-        story = []
+    def student_report_data(student, enrollments):
+        return {
+            'username': student.username,
+            'email': student.email,
+            'rows': [
+                [e.course.name, e.course.teacher.username, e.grade, e.attendance]
+                for e in enrollments
+            ],
+        }
+
+    @staticmethod
+    def course_report_data(course, enrollments, stats=None):
+        report = {
+            'name': course.name,
+            'teacher': course.teacher.username,
+            'rows': [
+                [e.student.username, e.grade, e.attendance]
+                for e in enrollments
+            ],
+        }
+        # Médias pré-calculadas (CourseStats), quando disponíveis
+        if stats is not None:
+            report['mean_grade'] = stats.mean_grade
+            report['mean_attendance'] = stats.mean_attendance
+        return report
+
+    @staticmethod
+    def report_key(kind, report):
+        # Hash do conteúdo do relatório: dados iguais geram o mesmo arquivo
+        payload = json.dumps([PDFGenerator.LAYOUT_VERSION, kind, report], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def build_student_report(report, output):
+        doc = SimpleDocTemplate(output, pagesize=letter)
+        doc.build(PDFGenerator.student_report_story(report, getSampleStyleSheet()))
+
+    @staticmethod
+    def build_student_reports(reports, output):
+        # Vários alunos em um único PDF, cada um iniciando em uma nova página
+        doc = SimpleDocTemplate(output, pagesize=letter)
         styles = getSampleStyleSheet()
+        story = []
+        for index, report in enumerate(reports):
+            if index:
+                story.append(PageBreak())
+            story.extend(PDFGenerator.student_report_story(report, styles))
+        doc.build(story)
+
+    @staticmethod
+    def student_report_story(report, styles):
+        story = []
         
         # Título
-        title = Paragraph(f"Relatório do Aluno - {student.username}", styles['Heading1'])
+        title = Paragraph(f"Relatório do Aluno - {report['username']}", styles['Heading1'])
         story.append(title)
         story.append(Spacer(1, 12))
         
         # Informações do aluno
-        story.append(Paragraph(f"Email: {student.email}", styles['Normal']))
+        story.append(Paragraph(f"Email: {report['email']}", styles['Normal']))
         story.append(Spacer(1, 12))
         
         # Tabela de notas
         data = [['Curso', 'Professor', 'Nota', 'Frequência']]
-        for enrollment in enrollments:
+        for course_name, teacher_name, grade, attendance in report['rows']:
             data.append([
-                enrollment.course.name,
-                enrollment.course.teacher.username,
-                str(enrollment.grade or 'N/A'),
-                f"{enrollment.attendance}%"
+                course_name,
+                teacher_name,
+                str(grade or 'N/A'),
+                f"{attendance}%"
             ])
         
         table = Table(data, colWidths=[2.5*inch, 2*inch, 1*inch, 1*inch])
@@ -55,40 +110,42 @@ class PDFGenerator:
             styles['Normal']
         ))
         
-        doc.build(story)
-        return filename
+        return story
 
     @staticmethod
-    def generate_course_report(course, enrollments):
-        filename = f"course_report_{course.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        doc = SimpleDocTemplate(f"static/reports/{filename}", pagesize=letter)
+    def build_course_report(report, output):
+        doc = SimpleDocTemplate(output, pagesize=letter)
         story = []
         styles = getSampleStyleSheet()
         
         # Título
-        title = Paragraph(f"Relatório do Curso - {course.name}", styles['Heading1'])
+        title = Paragraph(f"Relatório do Curso - {report['name']}", styles['Heading1'])
         story.append(title)
         story.append(Spacer(1, 12))
         
         # Informações do curso
-        story.append(Paragraph(f"Professor: {course.teacher.username}", styles['Normal']))
-        story.append(Paragraph(f"Total de Alunos: {len(enrollments)}", styles['Normal']))
+        story.append(Paragraph(f"Professor: {report['teacher']}", styles['Normal']))
+        story.append(Paragraph(f"Total de Alunos: {len(report['rows'])}", styles['Normal']))
         story.append(Spacer(1, 12))
         
         # Tabela de alunos e notas
         data = [['Aluno', 'Nota', 'Frequência']]
-        for enrollment in enrollments:
+        for student_name, grade, attendance in report['rows']:
             data.append([
-                enrollment.student.username,
-                str(enrollment.grade or 'N/A'),
-                f"{enrollment.attendance}%"
+                student_name,
+                str(grade or 'N/A'),
+                f"{attendance}%"
             ])
         
         # Adicionar linha com médias
-        grades = [e.grade for e in enrollments if e.grade is not None]
-        attendance = [e.attendance for e in enrollments if e.attendance is not None]
-        avg_grade = sum(grades) / len(grades) if grades else 'N/A'
-        avg_attendance = sum(attendance) / len(attendance) if attendance else 'N/A'
+        if 'mean_grade' in report:
+            avg_grade = report['mean_grade'] if report['mean_grade'] is not None else 'N/A'
+            avg_attendance = report['mean_attendance'] if report['mean_attendance'] is not None else 'N/A'
+        else:
+            grades = [row[1] for row in report['rows'] if row[1] is not None]
+            attendance = [row[2] for row in report['rows'] if row[2] is not None]
+            avg_grade = sum(grades) / len(grades) if grades else 'N/A'
+            avg_attendance = sum(attendance) / len(attendance) if attendance else 'N/A'
         
         data.append(['Média', 
                     str(round(avg_grade, 2)) if avg_grade != 'N/A' else 'N/A',
@@ -119,4 +176,19 @@ class PDFGenerator:
         ))
         
         doc.build(story)
-        return filename
+
+
+def render_report(kind, report, output=None):
+    # Ponto de entrada dos processos de trabalho (ver utils/report_jobs.py).
+    # Sem `output`, o PDF é montado em memória e os bytes são retornados.
+    builders = {
+        'student': PDFGenerator.build_student_report,
+        'course': PDFGenerator.build_course_report,
+        'students': PDFGenerator.build_student_reports,
+    }
+    if output is None:
+        buffer = BytesIO()
+        builders[kind](report, buffer)
+        return buffer.getvalue()
+    builders[kind](report, output)
+    return output
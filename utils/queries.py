@@ -0,0 +1,119 @@
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.orm import aliased, joinedload
+from app import db
+from models import User, Course, Enrollment
+
+
+# Carregadores reutilizáveis: cada um resolve as relações usadas pelas telas e
+# relatórios em um número constante de consultas (sem N+1).
+
+def course_enrollments(course_id):
+    return (
+        Enrollment.query
+        .options(joinedload(Enrollment.student))
+        .filter(Enrollment.course_id == course_id)
+        .order_by(Enrollment.id)
+        .all()
+    )
+
+
+def student_enrollments(student_id):
+    return (
+        Enrollment.query
+        .options(joinedload(Enrollment.course).joinedload(Course.teacher))
+        .filter(Enrollment.student_id == student_id)
+        .order_by(Enrollment.id)
+        .all()
+    )
+
+
+def program_enrollments(course_id=None):
+    # Matrículas completas dos alunos (de um curso ou de todo o programa), agrupáveis por aluno
+    query = Enrollment.query.options(
+        joinedload(Enrollment.student),
+        joinedload(Enrollment.course).joinedload(Course.teacher)
+    )
+    if course_id:
+        query = query.filter(Enrollment.student_id.in_(
+            select(Enrollment.student_id).where(Enrollment.course_id == course_id)
+        ))
+    return query.order_by(Enrollment.student_id, Enrollment.id).all()
+
+
+def courses_with_student_counts():
+    # Contagem agregada no SQL em vez de carregar as matrículas de cada curso
+    counts = (
+        select(Enrollment.course_id, func.count(Enrollment.id).label('student_count'))
+        .group_by(Enrollment.course_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(Course, func.coalesce(counts.c.student_count, 0))
+        .outerjoin(counts, counts.c.course_id == Course.id)
+        .options(joinedload(Course.teacher))
+        .order_by(Course.id)
+    ).all()
+    return [(course, student_count) for course, student_count in rows]
+
+
+def gradebook_export_query(course_id=None, teacher_id=None, role=None):
+    # Consulta apenas colunas (sem objetos ORM), para ser lida em streaming com yield_per.
+    # role filtra pelo papel atual do matriculado (p.ex. alunos que passaram a professor)
+    student = aliased(User)
+    teacher = aliased(User)
+    query = (
+        select(
+            student.name, student.username, student.email,
+            Course.id, Course.name, teacher.name,
+            Enrollment.grade, Enrollment.attendance
+        )
+        .select_from(Enrollment)
+        .join(student, Enrollment.student_id == student.id)
+        .join(Course, Enrollment.course_id == Course.id)
+        .outerjoin(teacher, Course.teacher_id == teacher.id)
+        .order_by(Course.id, student.name, Enrollment.id)
+    )
+    if course_id:
+        query = query.where(Course.id == course_id)
+    if teacher_id:
+        query = query.where(Course.teacher_id == teacher_id)
+    if role:
+        query = query.where(student.role == role)
+    return query
+
+
+def _prefix_filter(prefix):
+    # Busca por prefixo em minúsculas, atendida pelos índices lower(...) de User
+    pattern = prefix.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return or_(
+        func.lower(User.name).like(pattern, escape='\\'),
+        func.lower(User.username).like(pattern, escape='\\'),
+        func.lower(User.email).like(pattern, escape='\\'),
+    )
+
+
+def users_page(per_page, query=None, after=None):
+    # Paginação por keyset em (name, id); `after` é o par da última linha da página anterior
+    stmt = User.query
+    if query:
+        stmt = stmt.filter(_prefix_filter(query))
+    if after:
+        stmt = stmt.filter(tuple_(User.name, User.id) > after)
+    users = stmt.order_by(User.name, User.id).limit(per_page + 1).all()
+    next_after = None
+    if len(users) > per_page:
+        users = users[:per_page]
+        next_after = (users[-1].name, users[-1].id)
+    return users, next_after
+
+
+def search_users(prefix, limit, role=None, exclude_course_id=None):
+    stmt = User.query.filter(_prefix_filter(prefix))
+    if role:
+        stmt = stmt.filter(User.role == role)
+    if exclude_course_id:
+        # NOT EXISTS correlacionado, em vez de materializar os ids já matriculados
+        stmt = stmt.filter(~select(Enrollment.id).where(
+            Enrollment.student_id == User.id, Enrollment.course_id == exclude_course_id
+        ).exists())
+    return stmt.order_by(User.name, User.id).limit(limit).all()
@@ -0,0 +1,180 @@
+from datetime import datetime, time, timedelta
+from itertools import islice, takewhile
+from dateutil.rrule import rrulestr
+from flask import current_app
+from models import EventOverride
+from utils.cache import LRUCache
+
+
+def parse_rule(rule, dtstart):
+    # Levanta ValueError para regras inválidas
+    return rrulestr(rule, dtstart=dtstart)
+
+
+def rule_parts(rule):
+    parts = {}
+    for part in (rule or '').upper().split(';'):
+        key, _, value = part.partition('=')
+        if key:
+            parts[key.strip()] = value.strip()
+    return parts
+
+
+def build_rule(frequency, until=None, count=None):
+    # Regra simples a partir do formulário; UNTIL inclui o dia inteiro (hora local, como DTSTART)
+    if not frequency:
+        return None
+    rule = f'FREQ={frequency}'
+    if until is not None:
+        rule += ';UNTIL=' + datetime.combine(until, time(23, 59, 59)).strftime('%Y%m%dT%H%M%S')
+    if count is not None:
+        rule += f';COUNT={count}'
+    return rule
+
+
+def rule_form_fields(rule):
+    # (frequência, data final, número de ocorrências) de uma regra, para o formulário de edição
+    parts = rule_parts(rule)
+    until = parts.get('UNTIL')
+    count = parts.get('COUNT')
+    return (
+        parts.get('FREQ', ''),
+        datetime.strptime(until[:8], '%Y%m%d').date() if until else None,
+        int(count) if count and count.isdigit() else None,
+    )
+
+
+def _bounded_occurrences(rule, dtstart):
+    # Até RECURRENCE_MAX_OCCURRENCES + 1 ocorrências: o bastante para saber se a série passa do limite
+    limit = current_app.config['RECURRENCE_MAX_OCCURRENCES']
+    return list(islice(parse_rule(rule, dtstart), limit + 1)), limit
+
+
+def exceeds_max_occurrences(rule, dtstart):
+    occurrences, limit = _bounded_occurrences(rule, dtstart)
+    return len(occurrences) > limit
+
+
+def series_end(rule, start_date, end_date):
+    # Fim da última ocorrência (para o filtro por janela); None quando a série não tem fim.
+    # Séries acima de RECURRENCE_MAX_OCCURRENCES também ficam sem fim: a expansão para no
+    # limite de qualquer forma, e a regra nunca é percorrida além dele (UNTIL distante, COUNT alto)
+    parts = rule_parts(rule)
+    if 'COUNT' not in parts and 'UNTIL' not in parts:
+        return None
+    occurrences, limit = _bounded_occurrences(rule, start_date)
+    if len(occurrences) > limit:
+        return None
+    last = occurrences[-1] if occurrences else start_date
+    return last + (end_date - start_date)
+
+
+def set_recurrence(event, rule):
+    # Grava a regra e o fim da série; exceções só valem para as ocorrências da regra em que
+    # foram criadas, então somem quando a regra ou o horário da série muda
+    if rule:
+        parse_rule(rule, event.start_date)
+    if event.recurrence_rule and rule != event.recurrence_rule:
+        event.overrides.clear()
+    event.recurrence_rule = rule
+    event.recurrence_end = series_end(rule, event.start_date, event.end_date) if rule else None
+
+
+def _expansion_cache():
+    # Em memória do processo: a expansão é função pura da regra e da janela, nunca fica obsoleta
+    app = current_app._get_current_object()
+    if 'recurrence_cache' not in app.extensions:
+        app.extensions['recurrence_cache'] = LRUCache(maxsize=app.config['RECURRENCE_CACHE_SIZE'], ttl=0)
+    return app.extensions['recurrence_cache']
+
+
+def occurrence_starts(rule, dtstart, after, before):
+    # Inícios das ocorrências em [after, before), memorizados por regra/janela
+    limit = current_app.config['RECURRENCE_MAX_OCCURRENCES']
+    key = (rule, dtstart, after, before, limit)
+    cache = _expansion_cache()
+    starts = cache.get(key)
+    if starts is None:
+        occurrences = parse_rule(rule, dtstart).xafter(after, inc=True)
+        starts = tuple(takewhile(lambda start: start < before, islice(occurrences, limit)))
+        cache.set(key, starts)
+    return starts
+
+
+class Occurrence:
+    # Uma ocorrência de evento recorrente, com os atributos usados por serialize_event
+    def __init__(self, event, original_start, override=None):
+        duration = event.end_date - event.start_date
+        self.event = event
+        self.id = event.id
+        self.type = event.type
+        self.course_id = event.course_id
+        self.original_start = original_start
+        self.title = event.title
+        self.description = event.description
+        self.start_date = original_start
+        self.end_date = original_start + duration
+        self.overridden = override is not None
+        if override is not None:
+            self.title = override.title or event.title
+            self.description = override.description if override.description is not None else event.description
+            self.start_date = override.start_date or original_start
+            self.end_date = override.end_date or self.start_date + duration
+
+
+def _intersects(start_date, end_date, start, end):
+    return (start is None or end_date >= start) and (end is None or start_date < end)
+
+
+def expand_events(events, start=None, end=None):
+    # Troca cada evento recorrente pelas suas ocorrências dentro da janela [start, end).
+    # Exceções de todas as séries visíveis vêm de uma única consulta.
+    recurring = [event for event in events if event.recurrence_rule]
+    if not recurring:
+        return events
+
+    overrides = {}
+    for override in EventOverride.query.filter(EventOverride.event_id.in_([event.id for event in recurring])):
+        overrides.setdefault(override.event_id, {})[override.original_start] = override
+
+    if end is None:
+        end = (start or datetime.utcnow()) + timedelta(days=current_app.config['RECURRENCE_HORIZON_DAYS'])
+
+    occurrences = []
+    for event in events:
+        if not event.recurrence_rule:
+            occurrences.append(event)
+            continue
+        exceptions = overrides.get(event.id, {})
+        # Ocorrências que começam antes da janela mas ainda estão em andamento nela
+        after = event.start_date if start is None else max(event.start_date, start - (event.end_date - event.start_date))
+        try:
+            starts = occurrence_starts(event.recurrence_rule, event.start_date, after, end)
+        except ValueError:
+            # Regra inválida (gravada fora do formulário): mostra só a primeira ocorrência
+            current_app.logger.warning('Regra de recorrência inválida no evento %s: %s', event.id, event.recurrence_rule)
+            if _intersects(event.start_date, event.end_date, start, end):
+                occurrences.append(event)
+            continue
+        for original_start in starts:
+            if original_start not in exceptions:
+                occurrences.append(Occurrence(event, original_start))
+        # Exceções remarcadas podem entrar na janela vindas de uma ocorrência fora dela
+        for original_start, override in exceptions.items():
+            if override.cancelled:
+                continue
+            occurrence = Occurrence(event, original_start, override)
+            if _intersects(occurrence.start_date, occurrence.end_date, start, end):
+                occurrences.append(occurrence)
+
+    occurrences.sort(key=lambda occurrence: (occurrence.start_date, occurrence.id))
+    return occurrences
+
+
+def is_occurrence(event, original_start):
+    # Confere se original_start é uma ocorrência da série (a URL da exceção vem do cliente)
+    if not event.recurrence_rule:
+        return False
+    return original_start in occurrence_starts(
+        event.recurrence_rule, event.start_date, original_start, original_start + timedelta(seconds=1)
+    )
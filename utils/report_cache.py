@@ -0,0 +1,71 @@
+import glob
+import os
+import time
+from flask import current_app
+from utils.pdf_generator import PDFGenerator
+
+
+class ReportCache:
+    # PDFs endereçados pelo conteúdo: <tipo>_<id>_<hash>.pdf no diretório de relatórios
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def filename(self, kind, subject_id, report):
+        return f'{kind}_{subject_id}_{PDFGenerator.report_key(kind, report)}.pdf'
+
+    def lookup(self, filename):
+        # Atualiza o mtime para que a remoção por tamanho siga a ordem LRU
+        try:
+            os.utime(os.path.join(self.directory, filename))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _remove(self, path):
+        # Outro worker pode ter removido o mesmo arquivo (invalidate/evict concorrentes)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def invalidate(self, kind, subject_id):
+        for path in glob.glob(os.path.join(self.directory, f'{kind}_{subject_id}_*.pdf')):
+            self._remove(path)
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            # Remove arquivos expirados (inclusive restos de gerações interrompidas)
+            if now - stat.st_mtime > self.max_age:
+                self._remove(entry.path)
+            elif entry.name.endswith('.pdf'):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        # Mantém o diretório dentro do limite, removendo os menos usados primeiro
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+
+def get_report_cache():
+    app = current_app._get_current_object()
+    if 'report_cache' not in app.extensions:
+        app.extensions['report_cache'] = ReportCache(
+            app.config['REPORTS_DIR'],
+            app.config['REPORT_CACHE_MAX_BYTES'],
+            app.config['REPORT_CACHE_MAX_AGE']
+        )
+    return app.extensions['report_cache']
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from flask import current_app
+from utils.cache import create_cache
+from utils.pdf_generator import render_report
+
+# Estado dos jobs em REPORTS_DIR/jobs, visível para todos os workers do gunicorn: o pedido de
+# status ou o download pode cair em um processo diferente do que recebeu o job
+JOBS_SUBDIR = 'jobs'
+JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ReportJob:
+    FIELDS = ('id', 'kind', 'owner_id', 'dedupe_key', 'filename', 'download_name', 'retry_url',
+              'temporary', 'status', 'completed', 'total', 'error', 'created_at', 'finished_at')
+
+    def __init__(self, kind, owner_id, dedupe_key, download_name, filename=None, retry_url=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner_id = owner_id
+        self.dedupe_key = dedupe_key
+        # Caminho do arquivo gerado, relativo a REPORTS_DIR; None quando o PDF fica só no cache de saídas
+        self.filename = filename
+        self.download_name = download_name
+        # Rota que gera o relatório de novo, se o arquivo sumir antes do download
+        self.retry_url = retry_url
+        self.temporary = False  # arquivo removido junto com o job (fora do cache de relatórios)
+        self.status = 'pending'  # pending, done, failed
+        self.completed = 0
+        self.total = 1
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @classmethod
+    def from_record(cls, record):
+        job = cls.__new__(cls)
+        for field in cls.FIELDS:
+            setattr(job, field, record.get(field))
+        return job
+
+    def to_record(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'progress': {'completed': self.completed, 'total': self.total},
+        }
+
+
+def _dedupe_token(dedupe_key):
+    return hashlib.sha1(repr(dedupe_key).encode()).hexdigest()
+
+
+class ReportJobManager:
+    # Gera os PDFs em um pool de processos, fora das threads de requisição do gunicorn.
+    # Relatórios avulsos sem cache voltam como bytes e ficam no cache de saídas (CACHE_BACKEND,
+    # até REPORT_JOB_TTL); só os do cache de relatórios e os lotes são gravados em REPORTS_DIR.
+    def __init__(self, app):
+        self.directory = app.config['REPORTS_DIR']
+        self.jobs_directory = os.path.join(self.directory, JOBS_SUBDIR)
+        self.max_workers = app.config['REPORT_WORKERS']
+        self.job_ttl = app.config['REPORT_JOB_TTL']
+        self.logger = app.logger
+        self._outputs = create_cache(app, 'report_outputs', ttl=self.job_ttl,
+                                     maxsize=app.config['REPORT_OUTPUT_CACHE_SIZE'])
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        os.makedirs(self.jobs_directory, exist_ok=True)
+
+    def _executor(self):
+        # Pool criado sob demanda (e recriado após o fork de cada worker do gunicorn)
+        with self._pool_lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._pid = os.getpid()
+            return self._pool
+
+    def _write(self, path, data):
+        # Escrita atômica: quem lê nunca vê um registro pela metade
+        fd, tmp_path = tempfile.mkstemp(dir=self.jobs_directory)
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _record_path(self, job_id):
+        return os.path.join(self.jobs_directory, f'{job_id}.json')
+
+    def _pending_path(self, token):
+        return os.path.join(self.jobs_directory, f'pending-{token}')
+
+    def _save(self, job):
+        self._write(self._record_path(job.id), json.dumps(job.to_record()))
+
+    def get(self, job_id):
+        if not JOB_ID.match(job_id or ''):
+            return None
+        try:
+            with open(self._record_path(job_id)) as fh:
+                job = ReportJob.from_record(json.load(fh))
+        except (OSError, ValueError):
+            return None
+        if job.status == 'pending' and job.created_at < time.time() - self.job_ttl:
+            # O processo que gerava o relatório morreu (reinício do worker) sem concluir
+            job.status = 'failed'
+            job.error = 'Tempo esgotado'
+        return job
+
+    def output(self, job):
+        # Bytes de um relatório que não foi gravado em disco; None se já saiu do cache
+        return self._outputs.get(job.id)
+
+    def _existing_pending(self, dedupe_key):
+        # Pedidos idênticos ainda pendentes (em qualquer worker) reutilizam o mesmo job
+        try:
+            with open(self._pending_path(_dedupe_token(dedupe_key))) as fh:
+                job = self.get(fh.read().strip())
+        except OSError:
+            return None
+        return job if job is not None and job.status == 'pending' else None
+
+    def _register(self, job):
+        job.dedupe_key = _dedupe_token(job.dedupe_key)
+        self._save(job)
+        self._write(self._pending_path(job.dedupe_key), job.id)
+
+    def submit(self, kind, report, owner_id, dedupe_key, download_name, filename=None, retry_url=None):
+        with self._lock:
+            self._expire_finished()
+            existing = self._existing_pending(dedupe_key)
+            if existing is not None:
+                return existing
+
+            job = ReportJob(kind, owner_id, dedupe_key, download_name, filename, retry_url)
+            self._register(job)
+            if filename is None:
+                # Fora do cache de relatórios: o PDF é montado em memória e volta como bytes
+                future = self._executor().submit(render_report, kind, report)
+            else:
+                # Gera em um arquivo temporário: o nome final só aparece quando o PDF está completo
+                future = self._executor().submit(
+                    render_report, kind, report, os.path.join(self.directory, filename + '.part')
+                )
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def submit_batch(self, reports, owner_id, dedupe_key, download_name, merge=False, retry_url=None):
+        # reports: lista de (nome do arquivo, dados do relatório de aluno)
+        with self._lock:
+            self._expire_finished()
+            existing = self._existing_pending(dedupe_key)
+            if existing is not None:
+                return existing
+
+            extension = 'pdf' if merge else 'zip'
+            job = ReportJob('batch', owner_id, dedupe_key, download_name, retry_url=retry_url)
+            job.filename = f'{JOBS_SUBDIR}/{job.id}.{extension}'
+            job.temporary = True
+            job.total = 1 if merge else len(reports)
+            self._register(job)
+
+        threading.Thread(target=self._run_batch, args=(job, reports, merge), daemon=True).start()
+        return job
+
+    def _run_batch(self, job, reports, merge):
+        # Lotes são gravados em disco: um ZIP com centenas de PDFs não deve ficar em memória
+        path = os.path.join(self.directory, job.filename)
+        try:
+            if merge:
+                self._executor().submit(
+                    render_report, 'students', [report for _, report in reports], path + '.part'
+                ).result()
+                job.completed = 1
+            else:
+                # Cada aluno é renderizado em paralelo; o ZIP é montado conforme os PDFs ficam prontos
+                futures = {
+                    self._executor().submit(render_report, 'student', report): name
+                    for name, report in reports
+                }
+                with zipfile.ZipFile(path + '.part', 'w', zipfile.ZIP_DEFLATED) as archive:
+                    for future in as_completed(futures):
+                        archive.writestr(futures[future], future.result())
+                        job.completed += 1
+                        self._save(job)
+            os.replace(path + '.part', path)
+        except Exception as error:
+            self._remove(path + '.part')
+            self._complete(job, error)
+        else:
+            self._complete(job, None)
+
+    def _finish(self, job, future):
+        error = future.exception()
+        if error is None:
+            if job.filename is None:
+                self._outputs.set(job.id, future.result())
+            else:
+                os.replace(future.result(), os.path.join(self.directory, job.filename))
+            job.completed = 1
+        self._complete(job, error)
+
+    def _complete(self, job, error):
+        if error is None:
+            job.status = 'done'
+        else:
+            job.status = 'failed'
+            job.error = str(error)
+            self.logger.error('Falha ao gerar relatório %s: %s', job.id, error)
+        job.finished_at = time.time()
+        self._save(job)
+        self._remove(self._pending_path(job.dedupe_key))
+
+    def _expire_finished(self):
+        # Registros (e arquivos temporários) de jobs antigos; vale para os jobs de todos os workers
+        cutoff = time.time() - self.job_ttl
+        for entry in os.scandir(self.jobs_directory):
+            if entry.name.startswith('pending-'):
+                # Marcador de um worker que morreu antes de concluir o job
+                if entry.stat().st_mtime < cutoff:
+                    self._remove(entry.path)
+                continue
+            if not entry.name.endswith('.json'):
+                continue
+            job = self.get(entry.name[:-len('.json')])
+            if job is None:
+                continue
+            finished_at = job.finished_at if job.status != 'pending' else None
+            if job.status == 'failed' and finished_at is None:
+                # Pendente abandonado (ver get)
+                finished_at = job.created_at
+            if finished_at is not None and finished_at < cutoff:
+                self._remove(entry.path)
+                if job.filename is None:
+                    self._outputs.delete(job.id)
+                elif job.temporary:
+                    self._remove(os.path.join(self.directory, job.filename))
+                    self._remove(os.path.join(self.directory, job.filename + '.part'))
+
+
+def get_report_jobs():
+    app = current_app._get_current_object()
+    if 'report_jobs' not in app.extensions:
+        app.extensions['report_jobs'] = ReportJobManager(app)
+    return app.extensions['report_jobs']
@@ -0,0 +1,97 @@
+from dataclasses import dataclass
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from app import db
+from models import User
+from utils.cache import get_cache
+from utils.db_routing import primary_reads
+
+# Campos cuja alteração invalida o snapshot de sessão do usuário
+SNAPSHOT_FIELDS = ('name', 'username', 'role', 'password_hash')
+
+
+@dataclass(frozen=True, eq=False)
+class SessionUser(UserMixin):
+    # Snapshot imutável do usuário logado: o suficiente para autenticação e templates
+    id: int
+    name: str
+    username: str
+    role: str
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(id=user.id, name=user.name, username=user.username, role=user.role)
+
+
+def _session_cache():
+    return get_cache('sessions', ttl=current_app.config['SESSION_USER_TTL'])
+
+
+def _shared_cache():
+    # Papel e senha só ficam em cache se a invalidação alcança todos os workers: com o
+    # backend 'memory', um usuário rebaixado ou com a senha trocada continuaria válido
+    # nos outros processos até o fim do SESSION_USER_TTL
+    return current_app.config['CACHE_BACKEND'] != 'memory'
+
+
+def load_session_user(user_id):
+    cache = _session_cache() if _shared_cache() else None
+    snapshot = cache.get(f'user:{user_id}') if cache is not None else None
+    if snapshot is None:
+        with primary_reads(db.session()):
+            user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = SessionUser.from_user(user)
+        if cache is not None:
+            cache.set(f'user:{user_id}', snapshot)
+    return snapshot
+
+
+def unread_notifications_count(user_id):
+    cache = _session_cache()
+    count = cache.get(f'unread:{user_id}')
+    if count is None:
+        with primary_reads(db.session()):
+            count = db.session.scalar(select(User.unread_notifications_count).where(User.id == user_id)) or 0
+        cache.set(f'unread:{user_id}', count)
+    return count
+
+
+def invalidate_user(user_id, session=None):
+    # Dentro de uma transação, a invalidação só acontece após o commit
+    session = session or db.session()
+    session.info.setdefault('invalidate_users', set()).add(user_id)
+
+
+def clear_session_cache():
+    _session_cache().clear()
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_user_changes(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if obj in session.deleted or any(
+                state.attrs[field].history.has_changes() for field in SNAPSHOT_FIELDS
+            ):
+                invalidate_user(obj.id, session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    user_ids = session.info.pop('invalidate_users', None)
+    if not user_ids:
+        return
+    cache = _session_cache()
+    for user_id in user_ids:
+        cache.delete(f'user:{user_id}')
+        cache.delete(f'unread:{user_id}')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('invalidate_users', None)